@@ -0,0 +1,217 @@
+import os
+import random
+import select
+import struct
+import threading
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+POLL_INTERVAL = float(os.environ.get("ASSET_POLL_INTERVAL", 5))
+
+# inotify(7) event bits for anything that changes a directory listing
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """libc inotify functions, or None when not on Linux"""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class AssetCatalog:
+    """Process-wide listing of B-roll directories.
+
+    Each directory is scanned once and then kept current by inotify, or by
+    polling directory mtimes where inotify is unavailable, so planners never
+    call os.listdir themselves.
+    """
+
+    def __init__(self, extensions=VIDEO_EXTENSIONS + IMAGE_EXTENSIONS, watch=None, poll_interval=POLL_INTERVAL):
+        self.extensions = tuple(extensions)
+        self.poll_interval = poll_interval
+        self._files = {}
+        self._mtimes = {}
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify_fd = None
+
+        watch = watch or os.environ.get("ASSET_WATCH", "inotify")
+        self._libc = _load_inotify() if watch == "inotify" else None
+        if self._libc:
+            fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+            if fd >= 0:
+                self._inotify_fd = fd
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify_fd is not None else "poll"
+
+    def _scan(self, directory):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            names = os.listdir(directory)
+        except OSError:
+            mtime, names = None, []
+        files = tuple(sorted(os.path.join(directory, f) for f in names
+                             if f.lower().endswith(self.extensions)))
+        with self._lock:
+            self._files[directory] = files
+            self._mtimes[directory] = mtime
+        return files
+
+    def _add_watch(self, directory):
+        if self._inotify_fd is None or not os.path.isdir(directory):
+            return
+        wd = self._libc.inotify_add_watch(self._inotify_fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            with self._lock:
+                self._watches[wd] = directory
+
+    def add_directories(self, directories):
+        """Scan and start watching directories that are not catalogued yet"""
+        for directory in directories:
+            if not directory:
+                continue
+            with self._lock:
+                known = directory in self._files
+            if not known:
+                self._scan(directory)
+                self._add_watch(directory)
+        self.start()
+
+    def files(self, directory):
+        """All catalogued files of a directory (scanned on first request)"""
+        with self._lock:
+            files = self._files.get(directory)
+        if files is None:
+            self.add_directories([directory])
+            with self._lock:
+                files = self._files[directory]
+        return files
+
+    def unused(self, rng=random):
+        """A fresh per-plan view for picking files without reuse"""
+        return UnusedFiles(self, rng)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="asset-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+    def _watch_loop(self):
+        while not self._stop.is_set():
+            if self._inotify_fd is not None:
+                ready, _, _ = select.select([self._inotify_fd], [], [], self.poll_interval)
+                if ready:
+                    self._drain_inotify()
+            else:
+                self._stop.wait(self.poll_interval)
+            # Directories that did not exist (or were replaced) are picked up by mtime
+            self._poll_mtimes()
+
+    def _drain_inotify(self):
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        changed = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size + name_len
+            with self._lock:
+                directory = self._watches.get(wd)
+                if mask & IN_IGNORED:
+                    self._watches.pop(wd, None)
+            if directory:
+                changed.add(directory)
+        for directory in changed:
+            self._scan(directory)
+
+    def _poll_mtimes(self):
+        with self._lock:
+            directories = list(self._mtimes.items())
+            watched = set(self._watches.values())
+        for directory, mtime in directories:
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime:
+                self._scan(directory)
+                if directory not in watched:
+                    self._add_watch(directory)
+
+
+class UnusedFiles:
+    """Files not yet picked in one plan.
+
+    Each directory's pool is copied from the catalog on first use; picks are
+    a random swap-with-last pop, so every query is constant time.
+    """
+
+    def __init__(self, catalog, rng=random):
+        self.catalog = catalog
+        self.rng = rng
+        self._pools = {}
+
+    def remaining(self, directory):
+        pool = self._pools.get(directory)
+        return len(pool) if pool is not None else len(self.catalog.files(directory))
+
+    def reset(self):
+        self._pools.clear()
+
+    def pick(self, directory):
+        """Pick an unused file from a directory, or None if it has no files"""
+        pool = self._pools.get(directory)
+        if pool is None:
+            pool = self._pools[directory] = list(self.catalog.files(directory))
+        if not pool:
+            return None
+        i = self.rng.randrange(len(pool))
+        pool[i], pool[-1] = pool[-1], pool[i]
+        return pool.pop()
+
+
+_default_catalog = None
+_default_lock = threading.Lock()
+
+
+def get_asset_catalog():
+    """Process-wide catalog of B-roll files"""
+    global _default_catalog
+    with _default_lock:
+        if _default_catalog is None:
+            _default_catalog = AssetCatalog()
+        return _default_catalog
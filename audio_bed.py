@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+import threading
+import subprocess
+
+import numpy as np
+
+from forced_align import load_pcm, speech_regions, SAMPLE_RATE, FRAME_SECONDS
+from ffmpeg_runner import FFmpegRun
+from resource_usage import run as run_child
+from stage_executor import file_fingerprint
+from tracing import span as trace_span
+
+AUDIO_BED_DIR = os.environ.get("AUDIO_BED_DIR", "audio_bed_cache")
+AUDIO_BED_DUCK_DB = float(os.environ.get("AUDIO_BED_DUCK_DB", 6))
+AUDIO_BED_FADE = float(os.environ.get("AUDIO_BED_FADE", 0.3))  # seconds the music takes to duck or recover
+
+MIX_RATE = 48000
+MIX_CHANNELS = 2
+BLOCK_SECONDS = 10
+# amix halved both inputs; keep renders as loud as before
+MIX_GAIN = 0.5
+
+MUSIC_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac')
+
+
+def input_args(path):
+    """ffmpeg input arguments for a premix() file"""
+    return ['-f', 'f32le', '-ar', str(MIX_RATE), '-ac', str(MIX_CHANNELS), '-i', path]
+
+
+def _pcm_cmd(source, output):
+    return ['ffmpeg', '-v', 'error', '-y', '-i', source, '-vn',
+            '-f', 'f32le', '-ac', str(MIX_CHANNELS), '-ar', str(MIX_RATE), output]
+
+
+class TrackCache:
+    """Background music decoded once to 48 kHz stereo float32 on disk.
+
+    Renders memory-map the decoded file, so looping a track costs page
+    cache rather than process memory, and nothing is resampled twice.
+    Files are named after the track's path plus its size and mtime; when
+    a track changes, its new decode replaces the old file.
+    """
+
+    def __init__(self, cache_dir=AUDIO_BED_DIR):
+        self.cache_dir = cache_dir
+        self._maps = {}
+        self._decoding = {}
+        self._lock = threading.Lock()
+
+    def _prefix(self, track):
+        return hashlib.sha256(os.path.abspath(track).encode()).hexdigest()[:16]
+
+    def pcm_path(self, track):
+        digest = hashlib.sha256(json.dumps(file_fingerprint(track)).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{self._prefix(track)}-{digest}.f32")
+
+    def load(self, track):
+        """(samples, 2) float32 memmap of a track"""
+        path = self.pcm_path(track)
+        with self._lock:
+            pcm = self._maps.get(path)
+            if pcm is not None:
+                return pcm
+            # One decode per track; other tracks and cache hits never wait on it
+            decoding = self._decoding.setdefault(path, threading.Lock())
+        with decoding:
+            with self._lock:
+                pcm = self._maps.get(path)
+            if pcm is not None:
+                return pcm
+            try:
+                if not os.path.exists(path):
+                    self._decode(track, path)
+                    self._drop_stale(track, path)
+                if not os.path.getsize(path):
+                    raise ValueError(f"No audio in {track}")
+                pcm = np.memmap(path, dtype=np.float32, mode='r').reshape(-1, MIX_CHANNELS)
+                with self._lock:
+                    self._maps[path] = pcm
+            finally:
+                with self._lock:
+                    self._decoding.pop(path, None)
+        return pcm
+
+    def _decode(self, track, path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        cmd = _pcm_cmd(track, tmp)
+        try:
+            with trace_span('ffmpeg decode music', cat='subprocess', cmd=' '.join(cmd)):
+                run_child(cmd, check=True)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _drop_stale(self, track, path):
+        """Remove decodes of earlier versions of track (mapped copies stay readable)"""
+        prefix = self._prefix(track) + "-"
+        for name in os.listdir(self.cache_dir):
+            stale = os.path.join(self.cache_dir, name)
+            if name.startswith(prefix) and name.endswith(".f32") and stale != path:
+                with self._lock:
+                    self._maps.pop(stale, None)
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def start_warmup(self, directory):
+        """Decode every track in directory on a background thread"""
+        threading.Thread(target=self._warm_up, args=(directory,), name="audio-bed-warmup", daemon=True).start()
+
+    def _warm_up(self, directory):
+        if not os.path.isdir(directory):
+            return
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(MUSIC_EXTENSIONS):
+                try:
+                    self.load(os.path.join(directory, name))
+                except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                    print(f"⚠️  Could not decode {name}: {e}")
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_track_cache():
+    """Process-wide cache of decoded background music"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TrackCache()
+        return _default_cache
+
+
+def duck_gains(voice, duck_db=AUDIO_BED_DUCK_DB, fade=AUDIO_BED_FADE):
+    """Music gain per FRAME_SECONDS frame of a load_pcm() voiceover, lowered while it speaks"""
+    frames = max(1, int(np.ceil(len(voice) / SAMPLE_RATE / FRAME_SECONDS)))
+    regions = np.array(speech_regions(voice), dtype=np.float64).reshape(-1, 2)
+    edges = np.zeros(frames + 1)
+    np.add.at(edges, np.clip((regions[:, 0] / FRAME_SECONDS).astype(int), 0, frames), 1)
+    np.add.at(edges, np.clip((regions[:, 1] / FRAME_SECONDS).astype(int), 0, frames), -1)
+    voiced = np.cumsum(edges[:-1]) > 0
+    target = np.where(voiced, 10 ** (-duck_db / 20), 1.0)
+
+    # Moving average = linear ramps of `fade` seconds into and out of each duck
+    width = max(1, int(fade / FRAME_SECONDS))
+    padded = np.pad(target, width, mode='edge')
+    return np.convolve(padded, np.ones(width) / width, mode='same')[width:-width]
+
+
+def premix(voice_path, track, output, volume, cache=None, **run_kwargs):
+    """Write the voiceover mixed with `track` as 48 kHz stereo f32le.
+
+    The music is looped and trimmed to the voiceover and ducked under
+    speech. The voiceover is streamed through in blocks, so memory stays
+    bounded whatever its length. run_kwargs go to FFmpegRun (register/
+    unregister, so a cancel can kill the decoder).
+    """
+    bed = (cache or get_track_cache()).load(track)
+    gains = duck_gains(load_pcm(voice_path))
+    frame_times = (np.arange(len(gains)) + 0.5) * FRAME_SECONDS
+
+    cmd = ['ffmpeg', '-v', 'error', '-i', voice_path, '-vn',
+           '-f', 'f32le', '-ac', str(MIX_CHANNELS), '-ar', str(MIX_RATE), 'pipe:1']
+    run = FFmpegRun(cmd, stdout=subprocess.PIPE, stage='audio_bed', **run_kwargs).start()
+    block = MIX_RATE * BLOCK_SECONDS * MIX_CHANNELS * 4
+    position = 0
+    try:
+        with open(output, 'wb') as out:
+            for data in iter(lambda: run.process.stdout.read(block), b''):
+                voice = np.frombuffer(data, dtype=np.float32).reshape(-1, MIX_CHANNELS)
+                index = np.arange(position, position + len(voice))
+                gain = np.interp(index / MIX_RATE, frame_times, gains) * volume
+                mixed = (voice + bed[index % len(bed)] * gain[:, None]) * MIX_GAIN
+                out.write(mixed.astype(np.float32).tobytes())
+                position += len(voice)
+    except BaseException:
+        # Unblock a decoder stuck writing to a pipe nobody reads any more
+        run.process.kill()
+        run.wait(check=False)
+        raise
+    run.wait()
+    return position > 0
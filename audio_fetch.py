@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+VOICEOVER_URL = os.environ.get(
+    "VOICEOVER_URL",
+    "https://raw.githubusercontent.com/RandomSci/Automation_For_Love_Niche/main/Audio_Voice/new_love.mp3"
+)
+# Extra hosts (or host:port) a request may name as its voiceover source; VOICEOVER_URL's host is always allowed
+VOICEOVER_HOSTS = {h.strip().lower() for h in os.environ.get("VOICEOVER_HOSTS", "").split(',') if h.strip()}
+# Downloads from other sources kept on disk, least recently used dropped first
+AUDIO_CACHE_FILES = int(os.environ.get("AUDIO_CACHE_FILES", 10))
+FETCH_TIMEOUT = (float(os.environ.get("FETCH_CONNECT_TIMEOUT", 5)), float(os.environ.get("FETCH_READ_TIMEOUT", 60)))
+CHUNK_SIZE = 256 * 1024
+
+
+class FetchError(Exception):
+    """Raised when a download is incomplete or the server refuses it"""
+
+
+def _make_session():
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET', 'HEAD']))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# One pooled session for every fetch in the process (keep-alive + TLS reuse)
+session = _make_session()
+
+_dest_locks = {}
+_dest_locks_guard = threading.Lock()
+
+
+# Cached downloads a job is still using; pruning leaves them alone
+_pinned = Counter()
+_pinned_lock = threading.Lock()
+
+
+def allowed_url(url):
+    """Whether url is an http(s) URL on VOICEOVER_URL's host or one in VOICEOVER_HOSTS"""
+    try:
+        parts = urlsplit(url)
+        host, netloc = (parts.hostname or '').lower(), parts.netloc.lower()
+    except ValueError:
+        return False
+    if parts.scheme not in ('http', 'https') or not host:
+        return False
+    allowed = VOICEOVER_HOSTS | {urlsplit(VOICEOVER_URL).hostname.lower()}
+    return host in allowed or netloc in allowed
+
+
+@contextmanager
+def _lock_for(dest, blocking=True):
+    """Hold dest's lock, yielding whether it was acquired; the entry is dropped once unused"""
+    key = os.path.abspath(dest)
+    with _dest_locks_guard:
+        entry = _dest_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    acquired = entry[0].acquire(blocking)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            entry[0].release()
+        with _dest_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _dest_locks[key]
+
+
+def _range_start(response):
+    """First byte of a 206 response, from Content-Range (None if absent or unparsable)"""
+    match = re.match(r"bytes\s+(\d+)-", response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
+
+
+def _meta_path(dest):
+    return dest + ".meta.json"
+
+
+def _load_meta(dest):
+    try:
+        with open(_meta_path(dest), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_meta(dest, meta):
+    with open(_meta_path(dest), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def _validator_headers(meta):
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+
+def cache_path(url, directory="Audio_Voice"):
+    """Local copy of a voiceover URL (the default source keeps its old name)"""
+    if url == VOICEOVER_URL:
+        return os.path.join(directory, "new_love.mp3")
+    ext = os.path.splitext(url.split('?')[0])[1] or ".mp3"
+    return os.path.join(directory, "fetched", hashlib.sha1(url.encode()).hexdigest()[:16] + ext)
+
+
+@contextmanager
+def pinned(path):
+    """Keep prune_fetched() away from path for the with-block"""
+    path = os.path.abspath(path)
+    with _pinned_lock:
+        _pinned[path] += 1
+    try:
+        yield
+    finally:
+        with _pinned_lock:
+            _pinned[path] -= 1
+            if not _pinned[path]:
+                del _pinned[path]
+
+
+def prune_fetched(directory="Audio_Voice", keep=AUDIO_CACHE_FILES):
+    """Remove the least recently fetched non-default downloads beyond `keep`"""
+    fetched = os.path.join(directory, "fetched")
+    if not os.path.isdir(fetched):
+        return 0
+    files = [os.path.abspath(os.path.join(fetched, name)) for name in os.listdir(fetched)
+             if not name.endswith(('.part', '.meta.json'))]
+    files.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0, reverse=True)
+    removed = 0
+    for path in files[keep:]:
+        with _pinned_lock:
+            if _pinned[path]:
+                continue
+        # A file being downloaded right now is in use; never wait on it
+        with _lock_for(path, blocking=False) as held:
+            if not held:
+                continue
+            with _pinned_lock:
+                if _pinned[path]:
+                    continue
+            for stale in (path, _meta_path(path)):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            removed += 1
+    return removed
+
+
+def fetch(url, dest, timeout=FETCH_TIMEOUT):
+    """Bring dest up to date with url. Returns (dest, downloaded)
+
+    Unchanged files are skipped with a conditional GET (304). Downloads
+    stream into dest.part, resume from it with a Range request when the
+    server still has the same version (starting over if it answers with
+    another range), and are length-checked before replacing dest.
+    """
+    with _lock_for(dest):
+        os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+        meta = _load_meta(dest) if os.path.exists(dest) else {}
+        if meta.get('url') != url or meta.get('length') not in (None, os.path.getsize(dest)):
+            meta = {}
+
+        part = dest + ".part"
+        part_meta = _load_meta(part) if os.path.exists(part) else {}
+        if part_meta.get('url') != url:
+            part_meta = {}
+        offset = os.path.getsize(part) if part_meta else 0
+
+        # identity so Content-Length is the number of bytes written to disk
+        headers = {'Accept-Encoding': 'identity', **_validator_headers(meta)}
+        if offset and (part_meta.get('etag') or part_meta.get('last_modified')):
+            headers['Range'] = f"bytes={offset}-"
+            headers['If-Range'] = part_meta.get('etag') or part_meta['last_modified']
+        else:
+            offset = 0
+
+        while True:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    print(f"✅ {os.path.basename(dest)} unchanged (304), skipping download")
+                    # mtime is the last use, for prune_fetched()
+                    os.utime(dest)
+                    return dest, False
+                if response.status_code not in (200, 206):
+                    raise FetchError(f"GET {url} returned {response.status_code}")
+
+                if response.status_code == 200:
+                    offset = 0
+                elif _range_start(response) != offset:
+                    if 'Range' not in headers:
+                        raise FetchError(f"GET {url} returned a partial response nobody asked for")
+                    # Appending would corrupt the file; fetch it whole
+                    headers.pop('Range')
+                    headers.pop('If-Range')
+                    offset = 0
+                    continue
+                expected = response.headers.get('Content-Length')
+                expected = int(expected) + offset if expected is not None else None
+
+                new_meta = {
+                    'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                _save_meta(part, new_meta)
+
+                with open(part, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+            break
+
+        size = os.path.getsize(part)
+        if expected is not None and size != expected:
+            raise FetchError(f"Incomplete download of {url}: {size} of {expected} bytes")
+
+        os.replace(part, dest)
+        os.remove(_meta_path(part))
+        _save_meta(dest, {**new_meta, 'length': size})
+        resumed = f", resumed at {offset} bytes" if offset else ""
+        print(f"📥 Downloaded {os.path.basename(dest)} ({size / 1024:.0f} KB{resumed})")
+        return dest, True
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import hashlib
+import subprocess
+
+# Bump when a spec or encode setting changes so cached fixtures are rebuilt
+FIXTURE_VERSION = 2
+FIXTURE_DIR = os.environ.get("BENCH_FIXTURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures"))
+
+CLIP_SECONDS = 10
+
+# (category, name, width, height, fps): portrait, landscape and a mixed bag of
+# resolutions/aspects so normalize_filters takes every branch
+CLIPS = [
+    ('portrait', 'portrait_1080p', 1080, 1920, 30),
+    ('portrait', 'portrait_720p', 720, 1280, 30),
+    ('portrait', 'portrait_540p', 540, 960, 25),
+    ('landscape', 'landscape_1080p', 1920, 1080, 30),
+    ('landscape', 'landscape_720p', 1280, 720, 30),
+    ('landscape', 'landscape_480p', 854, 480, 24),
+    ('mixed', 'square_1080', 1080, 1080, 30),
+    ('mixed', 'sd_4x3', 640, 480, 25),
+    ('mixed', 'portrait_1440p_60fps', 1440, 2560, 60),
+]
+
+# (category, name, width, height): stills rendered with Ken Burns motion
+STILLS = [
+    ('stills', 'still_portrait', 1080, 1920),
+    ('stills', 'still_4x3', 2048, 1536),
+    ('stills', 'still_square', 1200, 1200),
+]
+
+VOICEOVER_SECONDS = (15, 60, 180)
+MUSIC_SECONDS = 40  # shorter than most voiceovers so the music has to loop
+
+# Words the stubbed transcript is made of; each category's words steer the planner to it
+KEYWORD_MAP = {
+    'portrait': ['love', 'heart', 'romance', 'kiss'],
+    'landscape': ['journey', 'future', 'together', 'home'],
+    'mixed': ['change', 'growth', 'trust', 'time'],
+    'stills': ['memory', 'photo', 'moment', 'smile'],
+}
+
+# Same flags for every encode so the bytes only depend on the ffmpeg build
+BITEXACT = ['-map_metadata', '-1', '-fflags', '+bitexact', '-flags', '+bitexact', '-threads', '1']
+
+
+def _ffmpeg(args, output):
+    cmd = ['ffmpeg', '-y', '-v', 'error', *args, *BITEXACT, output]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
+def make_clip(path, width, height, fps, seconds=CLIP_SECONDS):
+    _ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28', '-g', str(fps * 2),
+        '-pix_fmt', 'yuv420p', '-an',
+    ], path)
+
+
+def make_voiceover(path, seconds):
+    # A tone with a pause every 3 s, so silence detection and alignment have something to find
+    _ffmpeg([
+        '-f', 'lavfi', '-i', f'sine=frequency=180:sample_rate=44100:duration={seconds}',
+        '-af', "volume='if(lt(mod(t,3),2.4),0.6,0)':eval=frame",
+        '-ac', '1', '-c:a', 'libmp3lame', '-b:a', '96k',
+    ], path)
+
+
+def make_music(path, seconds=MUSIC_SECONDS):
+    _ffmpeg([
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=44100:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=330:sample_rate=44100:duration={seconds}',
+        '-filter_complex', 'amix=inputs=2,aformat=channel_layouts=stereo',
+        '-c:a', 'libmp3lame', '-b:a', '128k',
+    ], path)
+
+
+def make_image(path, width=1080, height=1920):
+    _ffmpeg(['-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=1', '-frames:v', '1'], path)
+
+
+def voiceover_name(seconds):
+    return f"voiceover_{seconds}s.mp3"
+
+
+def _spec():
+    return {
+        'version': FIXTURE_VERSION,
+        'clips': CLIPS,
+        'stills': STILLS,
+        'clip_seconds': CLIP_SECONDS,
+        'voiceovers': VOICEOVER_SECONDS,
+        'music_seconds': MUSIC_SECONDS,
+        'flags': BITEXACT,
+    }
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def ensure_fixtures(root=FIXTURE_DIR, force=False):
+    """Build the fixture set once and return its manifest.
+
+    The manifest records the spec, the ffmpeg version and a sha256 of every
+    file, so results from two machines can be checked to be about the same
+    inputs.
+    """
+    manifest_path = os.path.join(root, 'manifest.json')
+    spec = _spec()
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('spec') == json.loads(json.dumps(spec)) and all(
+                os.path.exists(os.path.join(root, p)) for p in manifest['files']):
+            return manifest
+
+    print(f"🧪 Building benchmark fixtures in {root}...")
+    files = []
+    for category, name, width, height, fps in CLIPS:
+        os.makedirs(os.path.join(root, category), exist_ok=True)
+        rel = os.path.join(category, f"{name}.mp4")
+        make_clip(os.path.join(root, rel), width, height, fps)
+        files.append(rel)
+    for category, name, width, height in STILLS:
+        os.makedirs(os.path.join(root, category), exist_ok=True)
+        rel = os.path.join(category, f"{name}.jpg")
+        make_image(os.path.join(root, rel), width, height)
+        files.append(rel)
+    for seconds in VOICEOVER_SECONDS:
+        rel = voiceover_name(seconds)
+        make_voiceover(os.path.join(root, rel), seconds)
+        files.append(rel)
+    make_music(os.path.join(root, 'music.mp3'))
+    make_image(os.path.join(root, 'main_image.jpg'))
+    files.extend(['music.mp3', 'main_image.jpg'])
+
+    manifest = {
+        'spec': spec,
+        'ffmpeg': ffmpeg_version(),
+        'files': {rel: _sha256(os.path.join(root, rel)) for rel in files},
+    }
+    tmp = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
+    print(f"✅ {len(files)} fixtures ready")
+    return manifest
+
+
+def ffmpeg_version():
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.splitlines()[0] if result.stdout else None
+
+
+def niche_config(root=FIXTURE_DIR):
+    """Niche template pointing the generator at the fixture clips"""
+    return {
+        'broll_dirs': {category: os.path.join(root, category) for category in KEYWORD_MAP},
+        'keyword_map': KEYWORD_MAP,
+    }
+
+
+if __name__ == "__main__":
+    ensure_fixtures(force='--force' in sys.argv[1:])
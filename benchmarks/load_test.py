@@ -0,0 +1,430 @@
+"""Load test for the FastAPI service with a local stand-in for the audio source.
+
+    python benchmarks/load_test.py                                   # start the app, 20 users for 60 s
+    python benchmarks/load_test.py --users 50 --mix generate=1,poll=20,download=2,longpoll=2
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --duration 120   # an app already running
+
+The voiceover is served from a local HTTP server (ETag/Last-Modified, 304
+and Range like the GitHub raw URL, with optional latency and bandwidth
+limits) and every /generate names it as audio_url, so a running app given
+with --url needs VOICEOVER_HOSTS=127.0.0.1 to accept it. Virtual users loop over
+the weighted mix with exponential think times; a separate probe calls a
+trivial async endpoint every --probe-interval seconds, so its latency
+shows how much the render work stalls the event loop. Latency
+percentiles, throughput and error rates are reported per endpoint and
+written as JSON under benchmarks/results/.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import subprocess
+import tempfile
+import shutil
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from datetime import datetime, timezone
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_AUDIO = os.path.join(REPO_ROOT, "Audio_Voice", "new_love.mp3")
+
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_MIX = "generate=1,poll=20,download=2,longpoll=0"
+PROBE_PATH = "/events/__loop_probe__/poll?timeout=0"  # async handler that 404s at once
+PERCENTILES = (50, 90, 95, 99)
+
+
+class AudioSource(ThreadingHTTPServer):
+    """Serves one file the way raw.githubusercontent.com does"""
+
+    daemon_threads = True
+
+    def __init__(self, path, port=0, delay=0.0, kbps=0):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        self.etag = '"' + hashlib.sha1(self.data).hexdigest() + '"'
+        self.last_modified = formatdate(os.path.getmtime(path), usegmt=True)
+        self.delay = delay
+        self.kbps = kbps
+        self.statuses = {}
+        self._lock = threading.Lock()
+        super().__init__(('127.0.0.1', port), _AudioHandler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/Audio_Voice/voiceover.mp3"
+
+    def count(self, status):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class _AudioHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(body=False)
+
+    def do_GET(self, body=True):
+        src = self.server
+        if src.delay:
+            time.sleep(src.delay)
+        if self.headers.get('If-None-Match') == src.etag or (
+                not self.headers.get('If-None-Match') and self.headers.get('If-Modified-Since') == src.last_modified):
+            return self._reply(304)
+
+        start = 0
+        status = 200
+        byte_range = self.headers.get('Range', '')
+        if byte_range.startswith('bytes=') and self.headers.get('If-Range') in (None, src.etag, src.last_modified):
+            start = int(byte_range[6:].split('-')[0] or 0)
+            if start >= len(src.data):
+                return self._reply(416)
+            status = 206
+        payload = src.data[start:]
+        headers = {'Content-Type': 'audio/mpeg', 'ETag': src.etag, 'Last-Modified': src.last_modified}
+        if status == 206:
+            headers['Content-Range'] = f"bytes {start}-{len(src.data) - 1}/{len(src.data)}"
+        self._reply(status, headers, payload if body else b'', length=len(payload))
+
+    def _reply(self, status, headers=None, payload=b'', length=0):
+        self.server.count(status)
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        chunk = 64 * 1024
+        for i in range(0, len(payload), chunk):
+            self.wfile.write(payload[i:i + chunk])
+            if self.server.kbps:
+                time.sleep(chunk / (self.server.kbps * 1024))
+
+
+class Stats:
+    """Latency samples and outcomes per endpoint"""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency, status, ok):
+        with self._lock:
+            self._samples.setdefault(endpoint, []).append((latency, status, ok))
+
+    def samples(self, endpoint):
+        with self._lock:
+            return list(self._samples.get(endpoint, ()))
+
+    def endpoints(self):
+        with self._lock:
+            return list(self._samples)
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s[0] for s in samples)
+    n = len(latencies)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for s in samples if not s[2])
+    summary = {
+        'requests': n,
+        'throughput_rps': round(n / elapsed, 2) if elapsed else None,
+        'error_rate': round(errors / n, 4) if n else None,
+        'statuses': statuses,
+    }
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = round(latencies[min(n - 1, int(n * p / 100))] * 1000, 1) if n else None
+    summary['max_ms'] = round(latencies[-1] * 1000, 1) if n else None
+    return summary
+
+
+class LoadTest:
+    def __init__(self, base_url, audio_url, mix, users, duration, think, fresh, timeout, probe_interval):
+        self.base_url = base_url.rstrip('/')
+        self.audio_url = audio_url
+        self.mix = mix
+        self.users = users
+        self.duration = duration
+        self.think = think
+        self.fresh = fresh
+        self.timeout = timeout
+        self.probe_interval = probe_interval
+        self.stats = Stats()
+        self.jobs = []
+        self.completed = set()
+        self.processing = 0  # jobs rendering, from the monitor's /ready polls
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _call(self, session, endpoint, method, path, ok_statuses=(200,), **kwargs):
+        """One request; 5xx, timeouts and connection errors count as errors"""
+        start = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            if kwargs.get('stream'):
+                for _ in response.iter_content(256 * 1024):
+                    pass
+            latency = time.perf_counter() - start
+            self.stats.record(endpoint, latency, response.status_code, response.status_code < 500)
+            return response if response.status_code in ok_statuses else None
+        except requests.RequestException as e:
+            self.stats.record(endpoint, time.perf_counter() - start, type(e).__name__, False)
+            return None
+
+    def _job(self, rng, completed=False):
+        with self._lock:
+            pool = sorted(self.completed) if completed else self.jobs
+            return rng.choice(pool) if pool else None
+
+    def generate(self, session, rng):
+        body = {'audio_url': self.audio_url}
+        if self.fresh:
+            body['seed'] = rng.randrange(1 << 31)
+        response = self._call(session, 'POST /generate', 'POST', '/generate', json=body)
+        if response is not None:
+            with self._lock:
+                self.jobs.append(response.json()['job_id'])
+
+    def poll(self, session, rng):
+        job_id = self._job(rng)
+        path = f"/status/{job_id}" if job_id else "/status"
+        response = self._call(session, 'GET /status/{id}', 'GET', path, ok_statuses=(200, 404))
+        if response is not None and response.status_code == 200 and response.json().get('ready'):
+            with self._lock:
+                self.completed.add(response.json()['job_id'])
+
+    def download(self, session, rng):
+        job_id = self._job(rng, completed=True)
+        path = f"/download/{job_id}" if job_id else "/download"
+        # 400/404 just mean nothing is ready yet
+        self._call(session, 'GET /download/{id}', 'GET', path, ok_statuses=(200, 400, 404), stream=True)
+
+    def longpoll(self, session, rng):
+        job_id = self._job(rng)
+        if job_id is None:
+            return
+        self._call(session, 'GET /events/{id}/poll', 'GET', f"/events/{job_id}/poll?after=0&timeout=10")
+
+    def _user(self, seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        ops, weights = zip(*self.mix.items())
+        while not self._stop.is_set():
+            getattr(self, rng.choices(ops, weights)[0])(session, rng)
+            if self.think:
+                self._stop.wait(rng.expovariate(1 / self.think))
+
+    def _probe(self):
+        session = requests.Session()
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            try:
+                response = session.get(self.base_url + PROBE_PATH, timeout=self.timeout)
+                status, ok = response.status_code, response.status_code == 404
+            except requests.RequestException as e:
+                status, ok = type(e).__name__, False
+            label = 'loop probe (rendering)' if self.processing else 'loop probe (idle)'
+            self.stats.record(label, time.perf_counter() - start, status, ok)
+            self._stop.wait(self.probe_interval)
+
+    def _monitor(self):
+        session = requests.Session()
+        while not self._stop.is_set():
+            try:
+                self.processing = session.get(self.base_url + "/ready", timeout=self.timeout).json()['queue']['processing']
+            except (requests.RequestException, ValueError, KeyError):
+                pass
+            self._stop.wait(1.0)
+
+    def run(self):
+        threads = [threading.Thread(target=self._probe, daemon=True), threading.Thread(target=self._monitor, daemon=True)]
+        threads += [threading.Thread(target=self._user, args=(i,), daemon=True) for i in range(self.users)]
+        start = time.time()
+        for t in threads:
+            t.start()
+        try:
+            while (remaining := self.duration - (time.time() - start)) > 0:
+                time.sleep(min(5.0, remaining))
+                print(f"  … {time.time() - start:5.0f}s, {len(self.jobs)} jobs submitted, {self.processing} rendering")
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join(self.timeout + 1)
+        elapsed = time.time() - start
+        return {endpoint: summarize(self.stats.samples(endpoint), elapsed) for endpoint in sorted(self.stats.endpoints())}, elapsed
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ('generate', 'poll', 'download', 'longpoll'):
+            raise SystemExit(f"❌ Unknown operation in --mix: {name}")
+        if float(weight or 1) > 0:
+            mix[name] = float(weight or 1)
+    if not mix:
+        raise SystemExit("❌ --mix has no operation with a positive weight")
+    return mix
+
+
+def start_app(port, scratch, env_overrides):
+    """uvicorn main:app with every file it writes (outputs, caches, workspaces) in a scratch dir"""
+    env = dict(os.environ)
+    env.update({
+        'JOB_STORE_PATH': os.path.join(scratch, 'jobs.sqlite'),
+        'STAGE_CACHE_DIR': os.path.join(scratch, 'stage_cache'),
+        'MEDIA_INDEX_PATH': os.path.join(scratch, 'media_index.sqlite'),
+        'MEZZANINE_DIR': os.path.join(scratch, 'mezzanine_cache'),
+        'TRANSCRIPTION_CACHE_DIR': os.path.join(scratch, 'transcription_cache'),
+        'AUDIO_BED_DIR': os.path.join(scratch, 'audio_bed_cache'),
+        'OUTPUT_DIR': os.path.join(scratch, 'outputs'),
+        # Workspaces (and the startup sweep) stay out of the shared /dev/shm
+        'SCRATCH_ROOT': os.path.join(scratch, 'workspaces'),
+        'TMPFS_ROOT': os.path.join(scratch, 'shm'),
+        # The stand-in audio source
+        'VOICEOVER_HOSTS': '127.0.0.1',
+        **env_overrides,
+    })
+    log = open(os.path.join(scratch, 'app.log'), 'w', encoding='utf-8')
+    process = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port)],
+                               cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"❌ App exited with {process.returncode}, see {log.name}")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.kill()
+    raise SystemExit(f"❌ App did not come up within 120 s, see {log.name}")
+
+
+def _cell(value):
+    """A report figure, '-' where there was nothing to measure"""
+    return '-' if value is None else value
+
+
+def print_report(report, elapsed):
+    print(f"\n📊 {elapsed:.0f}s")
+    print(f"  {'endpoint':<26}{'reqs':>7}{'rps':>8}{'err%':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  statuses")
+    for endpoint, s in report.items():
+        err = f"{s['error_rate'] * 100:.1f}" if s['error_rate'] is not None else None
+        print(f"  {endpoint:<26}{s['requests']:>7}{_cell(s['throughput_rps']):>8}{_cell(err):>7}"
+              + ''.join(f"{_cell(s[k]):>9}" for k in ('p50_ms', 'p90_ms', 'p95_ms', 'p99_ms', 'max_ms'))
+              + f"  {s['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /generate, /status and /download")
+    parser.add_argument('--url', help="target an app that is already running (default: start one)")
+    parser.add_argument('--port', type=int, default=8765, help="port for the app this harness starts")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=60, help="seconds of traffic")
+    parser.add_argument('--think', type=float, default=0.5, help="mean think time between a user's requests (s)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument('--fresh', action='store_true', help="random seed per /generate, so renders miss the stage cache")
+    parser.add_argument('--timeout', type=float, default=30, help="per-request timeout (s)")
+    parser.add_argument('--probe-interval', type=float, default=0.2)
+    parser.add_argument('--audio', default=DEFAULT_AUDIO, help="file the stand-in audio source serves")
+    parser.add_argument('--source-delay', type=float, default=0.0, help="audio source latency per request (s)")
+    parser.add_argument('--source-kbps', type=float, default=0, help="audio source bandwidth cap (KB/s, 0 = none)")
+    parser.add_argument('--render-workers', type=int, help="RENDER_WORKERS for the started app")
+    parser.add_argument('--backlog', type=int, help="JOB_BACKLOG for the started app")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/load_<time>.json)")
+    args = parser.parse_args()
+
+    source = AudioSource(args.audio, delay=args.source_delay, kbps=args.source_kbps)
+    threading.Thread(target=source.serve_forever, daemon=True).start()
+    print(f"🎧 Audio source at {source.url}")
+
+    app = None
+    report = None
+    scratch = tempfile.mkdtemp(prefix="load_test_")
+    overrides = {}
+    if args.render_workers:
+        overrides['RENDER_WORKERS'] = str(args.render_workers)
+    if args.backlog:
+        overrides['JOB_BACKLOG'] = str(args.backlog)
+    try:
+        if args.url:
+            base_url = args.url
+        else:
+            app, base_url = start_app(args.port, scratch, overrides)
+            print(f"🚀 App started at {base_url} (log: {scratch}/app.log)")
+
+        mix = parse_mix(args.mix)
+        print(f"🔥 {args.users} users for {args.duration:.0f}s, mix {mix}")
+        test = LoadTest(base_url, source.url, mix, args.users, args.duration, args.think, args.fresh,
+                        args.timeout, args.probe_interval)
+        report, elapsed = test.run()
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted")
+    finally:
+        source.shutdown()
+        if app:
+            app.terminate()
+            try:
+                app.wait(10)
+            except subprocess.TimeoutExpired:
+                app.kill()
+        # A local app (started here or via --url) cached our stand-in voiceover
+        from audio_fetch import cache_path
+        cached = cache_path(source.url, os.path.join(REPO_ROOT, "Audio_Voice"))
+        for path in (cached, cached + ".meta.json"):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if report is None:
+        print("❌ Load test stopped before it finished, no report written")
+        sys.exit(1)
+    print_report(report, elapsed)
+    print(f"  audio source: {source.statuses}")
+    results = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'url': base_url,
+            'users': args.users,
+            'duration': elapsed,
+            'think': args.think,
+            'mix': mix,
+            'fresh': args.fresh,
+            'source_delay': args.source_delay,
+            'source_kbps': args.source_kbps,
+            'render_workers': args.render_workers,
+            'backlog': args.backlog,
+        },
+        'jobs_submitted': len(test.jobs),
+        'jobs_completed_seen': len(test.completed),
+        'audio_source': source.statuses,
+        'endpoints': report,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
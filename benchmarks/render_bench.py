@@ -0,0 +1,306 @@
+"""Render benchmark on synthetic fixtures, with Whisper stubbed out.
+
+    python benchmarks/render_bench.py                      # 15/60/180 s, file mode, 3 repeats
+    python benchmarks/render_bench.py --durations 60 --modes file,stream --repeat 5
+    python benchmarks/render_bench.py --compare old.json new.json
+
+Every run is a fresh interpreter with its own empty stage cache, media
+index and mezzanine dir, so each one is a cold render. Stage times come
+from the render's trace (see tracing.py); the CTA cost is the final pass
+minus the same final pass re-rendered without the CTA from the warm stage
+cache. Results (raw runs plus per-stage median/min/max) are written as
+JSON under benchmarks/results/, named by UTC time and commit.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+sys.path.insert(0, REPO_ROOT)
+
+from fixtures import ensure_fixtures, niche_config, ffmpeg_version, voiceover_name, KEYWORD_MAP, VOICEOVER_SECONDS, FIXTURE_DIR
+
+STAGES = ('probe', 'subtitles', 'keywords', 'plan', 'pass1', 'concat', 'audio_bed', 'final', 'cta', 'total')
+# Trace span -> reported stage
+SPAN_STAGES = {
+    'ffprobe': 'probe',
+    'stage subtitles': 'subtitles',
+    'stage keywords': 'keywords',
+    'stage plan': 'plan',
+    'pass1': 'pass1',
+    'stage concat': 'concat',
+    'stage audio_bed': 'audio_bed',
+    'stage final': 'final',
+    'render': 'total',
+}
+SEED = 20240601
+
+
+def write_stub_subtitles(path, duration, words_per_cue=3, seconds_per_word=0.4):
+    """Deterministic SRT standing in for Whisper, made of the niche keywords"""
+    vocabulary = [w for words in KEYWORD_MAP.values() for w in words]
+    lines = []
+    t, n, i = 0.0, 1, 0
+    while t + words_per_cue * seconds_per_word <= duration:
+        words = [vocabulary[(i + k) % len(vocabulary)] for k in range(words_per_cue)]
+        end = t + words_per_cue * seconds_per_word
+        lines.append(f"{n}\n{_srt_time(t)} --> {_srt_time(end)}\n{' '.join(words).upper()}\n")
+        t, n, i = end, n + 1, i + words_per_cue
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    return path
+
+
+def _srt_time(seconds):
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def stage_times(trace_path):
+    """Seconds per reported stage, summed over the trace's spans"""
+    with open(trace_path, 'r', encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    times = {}
+    for event in events:
+        stage = SPAN_STAGES.get(event.get('name'))
+        if stage and event.get('ph') == 'X':
+            times[stage] = times.get(stage, 0.0) + event['dur'] / 1_000_000
+    return times
+
+
+def run_one(spec):
+    """One cold render in this process (env already points at a fresh scratch dir)"""
+    from main_for_test import ViralShortsGenerator
+
+    class BenchGenerator(ViralShortsGenerator):
+        cta = True
+
+        def generate_subtitles_with_whisper(self, model="base", language="en", parallel=None, srt_path=None):
+            return write_stub_subtitles(srt_path or self._work_path("subtitles.srt"), self.get_audio_duration())
+
+        def _cta_filters(self, duration, texts):
+            return super()._cta_filters(duration, texts) if self.cta else []
+
+    scratch = spec['scratch']
+    result = {'duration': spec['duration'], 'mode': spec['mode'], 'repeat': spec['repeat']}
+
+    def render(name, cta=True):
+        gen = BenchGenerator(spec['main_image'], spec['audio'], os.path.join(scratch, f"{name}.mp4"),
+                             niche_config=spec['niche'], work_dir=os.path.join(scratch, 'work'),
+                             seed=SEED, stage_cache=True, trace=True)
+        gen.cta = cta
+        start = time.perf_counter()
+        ok = gen.create_viral_video(auto_generate_subs=True, subtitle_style="cursive_pink_soft",
+                                    bg_music=spec['music'], bg_volume=0.25, fps=30,
+                                    workers=spec['workers'], stream=spec['mode'] == 'stream')
+        wall = time.perf_counter() - start
+        return gen, ok, wall
+
+    os.makedirs(os.path.join(scratch, 'work'), exist_ok=True)
+    gen, ok, wall = render('bench')
+    result['ok'] = bool(ok)
+    result['wall'] = wall
+    result['stages'] = stage_times(gen.trace_path)
+    result['resources'] = gen.resources.snapshot()
+    result['output_bytes'] = os.path.getsize(gen.output_path) if os.path.exists(gen.output_path) else None
+
+    # Everything upstream of the final pass is cached now, so this reruns only the concat
+    # (a stream copy, never cached) and the final pass
+    plain, _, _ = render('bench_no_cta', cta=False)
+    final_no_cta = stage_times(plain.trace_path).get('final')
+    if final_no_cta is not None and 'final' in result['stages']:
+        result['stages']['final_no_cta'] = final_no_cta
+        result['stages']['cta'] = max(0.0, result['stages']['final'] - final_no_cta)
+    return result
+
+
+def spawn_run(spec):
+    """run_one in a fresh interpreter with caches redirected into spec['scratch']"""
+    scratch = spec['scratch']
+    env = dict(os.environ)
+    env.update({
+        'STAGE_CACHE': 'on',
+        'STAGE_CACHE_DIR': os.path.join(scratch, 'stage_cache'),
+        'MEDIA_INDEX_PATH': os.path.join(scratch, 'media_index.sqlite'),
+        'MEZZANINE_DIR': os.path.join(scratch, 'mezzanine_cache'),
+        'TRANSCRIPTION_CACHE_DIR': os.path.join(scratch, 'transcription_cache'),
+        'AUDIO_BED_DIR': os.path.join(scratch, 'audio_bed_cache'),
+        'TRACE_RENDERS': 'off',
+        'PYTHONHASHSEED': '0',
+    })
+    spec_path = os.path.join(scratch, 'spec.json')
+    out_path = os.path.join(scratch, 'result.json')
+    with open(spec_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    log_path = os.path.join(scratch, 'render.log')
+    with open(log_path, 'w', encoding='utf-8') as log:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', spec_path, '--result', out_path],
+                              cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    if proc.returncode != 0 or not os.path.exists(out_path):
+        with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+            tail = f.read()[-2000:]
+        return {'duration': spec['duration'], 'mode': spec['mode'], 'repeat': spec['repeat'],
+                'ok': False, 'error': tail}
+    with open(out_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def summarize(runs):
+    """{"<duration>s/<mode>": {stage: {median, min, max, n}}} over successful runs"""
+    groups = {}
+    for run in runs:
+        if 'stages' in run:
+            groups.setdefault(f"{run['duration']}s/{run['mode']}", []).append(run)
+    summary = {}
+    for name, group in groups.items():
+        stages = {}
+        for stage in STAGES + ('final_no_cta', 'wall'):
+            values = [r['wall'] if stage == 'wall' else r['stages'].get(stage) for r in group]
+            values = [v for v in values if v is not None]
+            if values:
+                stages[stage] = {'median': round(statistics.median(values), 3), 'min': round(min(values), 3),
+                                 'max': round(max(values), 3), 'n': len(values)}
+        summary[name] = stages
+    return summary
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def run_suite(durations, modes, repeat, workers, output=None, keep=False):
+    missing = [d for d in durations if d not in VOICEOVER_SECONDS]
+    if missing:
+        raise SystemExit(f"❌ No voiceover fixture for {missing} s (have {list(VOICEOVER_SECONDS)})")
+    manifest = ensure_fixtures()
+
+    root = tempfile.mkdtemp(prefix="render_bench_")
+    runs = []
+    try:
+        for duration in durations:
+            for mode in modes:
+                for i in range(repeat):
+                    spec = {
+                        'duration': duration, 'mode': mode, 'repeat': i, 'workers': workers,
+                        'audio': os.path.join(FIXTURE_DIR, voiceover_name(duration)),
+                        'music': os.path.join(FIXTURE_DIR, 'music.mp3'),
+                        'main_image': os.path.join(FIXTURE_DIR, 'main_image.jpg'),
+                        'niche': niche_config(),
+                        'scratch': os.path.join(root, f"{duration}s_{mode}_{i}"),
+                    }
+                    os.makedirs(spec['scratch'])
+                    print(f"⏱️  {duration}s voiceover, {mode} mode, run {i + 1}/{repeat}...", end='', flush=True)
+                    run = spawn_run(spec)
+                    runs.append(run)
+                    if 'stages' in run:
+                        print(f" {run['stages'].get('total', run['wall']):.1f}s")
+                    else:
+                        print(f" ❌ failed\n{run['error']}")
+                    if not keep:
+                        shutil.rmtree(spec['scratch'], ignore_errors=True)
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+        else:
+            print(f"📁 Run directories kept in {root}")
+
+    info = git_info()
+    results = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            **info,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': ffmpeg_version(),
+            'workers': workers,
+            'fixtures': manifest['files'],
+        },
+        'runs': runs,
+        'summary': summarize(runs),
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{(info['commit'] or 'nogit')[:10]}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print_summary(results['summary'])
+    print(f"\n💾 Results written to {output}")
+    return results
+
+
+def print_summary(summary):
+    for name, stages in summary.items():
+        print(f"\n📊 {name}")
+        for stage, s in stages.items():
+            print(f"  {stage:<13} median {s['median']:8.2f}s   min {s['min']:8.2f}s   max {s['max']:8.2f}s   (n={s['n']})")
+
+
+def compare(old_path, new_path):
+    """Per-stage median of new vs old, for scenarios present in both"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"old: {(old['meta'].get('commit') or '?')[:10]}{' (dirty)' if old['meta'].get('dirty') else ''}"
+          f"   new: {(new['meta'].get('commit') or '?')[:10]}{' (dirty)' if new['meta'].get('dirty') else ''}")
+    if old['meta'].get('fixtures') != new['meta'].get('fixtures'):
+        print("⚠️  Fixture checksums differ (another ffmpeg build?) - compare with care")
+    for name in old['summary']:
+        if name not in new['summary']:
+            continue
+        print(f"\n📊 {name}")
+        for stage, before in old['summary'][name].items():
+            after = new['summary'][name].get(stage)
+            if not after:
+                continue
+            delta = after['median'] - before['median']
+            pct = f"{delta / before['median'] * 100:+6.1f}%" if before['median'] else "   n/a"
+            print(f"  {stage:<13} {before['median']:8.2f}s -> {after['median']:8.2f}s   {delta:+7.2f}s {pct}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark create_viral_video on synthetic fixtures")
+    parser.add_argument('--durations', default='15,60,180', help="voiceover lengths in seconds (15, 60, 180)")
+    parser.add_argument('--modes', default='file', help="file and/or stream (STREAM_PASSES)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None, help="PASS 1 workers (default: the generator's)")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument('--keep', action='store_true', help="keep the per-run scratch directories")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two results files")
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.run_one:
+        with open(args.run_one, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+        result = run_one(spec)
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+    else:
+        run_suite([int(d) for d in args.durations.split(',')], args.modes.split(','),
+                  args.repeat, args.workers, args.output, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import subprocess
+import os
+import sys
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from media_index import get_media_index
+
+MEZZANINE_DIR = os.environ.get("MEZZANINE_DIR", "mezzanine_cache")
+
+# Every mezzanine file is encoded with exactly these settings so per-job
+# segments can be cut with a stream copy and concatenated without re-encoding.
+MEZZANINE_SETTINGS = {
+    'width': 1080,
+    'height': 1920,
+    'fps': 30,
+    'pix_fmt': 'yuv420p',
+    'gop': 30,
+    'preset': 'medium',
+    'crf': 18,
+}
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+
+_index_lock = threading.Lock()
+
+
+def normalize_filters(aspect):
+    """Scale/crop (landscape) or scale/pad (portrait) filters to 1080x1920"""
+    if aspect and aspect < 0.7:
+        return [
+            "scale=1080:1920:force_original_aspect_ratio=decrease",
+            "pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black",
+        ]
+    return [
+        "scale=-2:1920:force_original_aspect_ratio=increase",
+        "crop=1080:1920",
+    ]
+
+
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """SHA-256 of the file contents"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mezzanine_key(content_hash, filters):
+    """Cache key: source content hash + the exact normalization parameters"""
+    params = json.dumps({'filters': filters, **MEZZANINE_SETTINGS}, sort_keys=True)
+    return hashlib.sha256(f"{content_hash}:{params}".encode()).hexdigest()[:32]
+
+
+def _index_path(cache_dir):
+    return os.path.join(cache_dir, "index.json")
+
+
+def _load_index(cache_dir):
+    try:
+        with open(_index_path(cache_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(cache_dir, index):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = _index_path(cache_dir) + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, _index_path(cache_dir))
+
+
+def _index_entry(filepath, index):
+    """Return the index entry for a source if its size and mtime still match"""
+    st = os.stat(filepath)
+    entry = index.get(os.path.abspath(filepath))
+    if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+        return entry
+    return None
+
+
+def mezzanine_for(filepath, cache_dir=MEZZANINE_DIR):
+    """Path of the normalized copy of a B-roll source, or None if not ingested"""
+    if not os.path.exists(filepath):
+        return None
+    with _index_lock:
+        entry = _index_entry(filepath, _load_index(cache_dir))
+    if not entry:
+        return None
+    path = os.path.join(cache_dir, f"{entry['key']}.mp4")
+    return path if os.path.exists(path) else None
+
+
+def ingest_file(filepath, cache_dir=MEZZANINE_DIR, force=False):
+    """Normalize one source into the mezzanine cache. Returns (path, encoded)"""
+    info = get_media_index().lookup(filepath)
+    aspect = info['width'] / info['height'] if info['width'] and info['height'] else None
+    filters = normalize_filters(aspect)
+    content_hash = file_sha256(filepath)
+    key = mezzanine_key(content_hash, filters)
+    output = os.path.join(cache_dir, f"{key}.mp4")
+    encoded = False
+
+    if force or not os.path.exists(output):
+        s = MEZZANINE_SETTINGS
+        vf = filters + [f"fps={s['fps']}", f"format={s['pix_fmt']}"]
+        tmp_output = f"{output}.{os.getpid()}.{threading.get_ident()}.part.mp4"
+        cmd = [
+            'ffmpeg', '-y', '-i', filepath,
+            '-vf', ','.join(vf),
+            '-c:v', 'libx264',
+            '-preset', s['preset'],
+            '-crf', str(s['crf']),
+            '-pix_fmt', s['pix_fmt'],
+            '-g', str(s['gop']),
+            '-keyint_min', str(s['gop']),
+            '-sc_threshold', '0',
+            '-an',
+            '-movflags', '+faststart',
+            tmp_output
+        ]
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            subprocess.run(cmd, check=True, capture_output=True)
+            os.replace(tmp_output, output)
+        finally:
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+        encoded = True
+
+    st = os.stat(filepath)
+    with _index_lock:
+        index = _load_index(cache_dir)
+        index[os.path.abspath(filepath)] = {
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+            'sha256': content_hash,
+            'key': key,
+        }
+        _save_index(cache_dir, index)
+
+    return output, encoded
+
+
+def collect_sources(broll_dirs):
+    """All video files in the given B-roll directories"""
+    sources = []
+    for directory in sorted(set(broll_dirs)):
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                sources.append(os.path.join(directory, name))
+    return sources
+
+
+def ingest_library(broll_dirs, cache_dir=MEZZANINE_DIR, workers=None, force=False):
+    """Normalize every B-roll source once; already cached files are skipped"""
+    sources = collect_sources(broll_dirs)
+    with _index_lock:
+        index = _load_index(cache_dir)
+    todo = []
+    for src in sources:
+        entry = _index_entry(src, index)
+        if force or not entry or not os.path.exists(os.path.join(cache_dir, f"{entry['key']}.mp4")):
+            todo.append(src)
+
+    print(f"📦 B-roll ingest: {len(sources)} sources, {len(todo)} to normalize")
+    if not todo:
+        return 0
+
+    workers = workers or max(1, (os.cpu_count() or 1) // 4)
+    encoded = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(ingest_file, src, cache_dir, force): src for src in todo}
+        for future in futures:
+            src = futures[future]
+            try:
+                _, did_encode = future.result()
+                encoded += did_encode
+                print(f"  ✓ {src}")
+            except subprocess.CalledProcessError as e:
+                failed += 1
+                print(f"  ❌ {src}: {e.stderr.decode(errors='replace')[-300:] if e.stderr else e}")
+
+    print(f"✅ Ingest complete: {encoded} encoded, {failed} failed")
+    return encoded
+
+
+if __name__ == "__main__":
+    from main import NICHE_TEMPLATES
+
+    niches = sys.argv[1:] or list(NICHE_TEMPLATES.keys())
+    dirs = []
+    for niche in niches:
+        if niche not in NICHE_TEMPLATES:
+            print(f"❌ Unknown niche: {niche}")
+            sys.exit(1)
+        dirs.extend(NICHE_TEMPLATES[niche]['broll_dirs'].values())
+    ingest_library(dirs)
@@ -0,0 +1,99 @@
+import asyncio
+import itertools
+import threading
+from collections import deque
+
+EVENT_HISTORY = 64
+SUBSCRIBER_BACKLOG = 256
+
+
+class Subscription:
+    """Events of one topic, delivered into an asyncio queue on the subscriber's loop"""
+
+    def __init__(self, bus, topic, loop, maxsize=SUBSCRIBER_BACKLOG):
+        self.bus = bus
+        self.topic = topic
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def _deliver(self, event):
+        # Runs on the subscriber's loop. A slow reader loses the oldest
+        # events; seq numbers let it notice and re-read the history.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """Next event, or None after timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self):
+        events = []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    def close(self):
+        self.bus._unsubscribe(self)
+
+
+class EventBus:
+    """In-process pub/sub from render threads to async HTTP handlers.
+
+    publish() may be called from any thread; each subscriber gets the event
+    through call_soon_threadsafe on its own event loop, so nothing polls.
+    The last EVENT_HISTORY events of every topic are kept with increasing
+    seq numbers for clients that reconnect or long-poll.
+    """
+
+    def __init__(self, history=EVENT_HISTORY):
+        self.history_size = history
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._history = {}
+        self._subscribers = {}
+
+    def publish(self, topic, event, data):
+        with self._lock:
+            item = {"seq": next(self._seq), "event": event, "data": data}
+            self._history.setdefault(topic, deque(maxlen=self.history_size)).append(item)
+            subscribers = list(self._subscribers.get(topic, ()))
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, item)
+            except RuntimeError:
+                # Loop already closed; the subscription goes away with it
+                pass
+        return item
+
+    def history(self, topic, after=0):
+        """Kept events of a topic with seq > after"""
+        with self._lock:
+            return [e for e in self._history.get(topic, ()) if e["seq"] > after]
+
+    def last_seq(self, topic):
+        with self._lock:
+            events = self._history.get(topic)
+            return events[-1]["seq"] if events else 0
+
+    def subscribe(self, topic):
+        """Subscribe from inside a coroutine (binds to the running loop)"""
+        sub = Subscription(self, topic, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(sub)
+        return sub
+
+    def _unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.topic)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.topic]
+
+    def forget(self, topic):
+        with self._lock:
+            self._history.pop(topic, None)
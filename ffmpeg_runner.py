@@ -0,0 +1,153 @@
+import subprocess
+import os
+import threading
+import time
+from collections import deque
+
+from tracing import begin as trace_begin
+from resource_usage import watch_child, wait_child, record_child
+
+STDERR_TAIL_LINES = 200
+
+
+def with_progress(cmd, target='pipe:1'):
+    """cmd with `-progress target -nostats` right after the program name"""
+    args = []
+    rest = iter(cmd[1:])
+    for arg in rest:
+        if arg == '-progress':
+            next(rest, None)
+        elif arg != '-nostats':
+            args.append(arg)
+    return [cmd[0], '-progress', target, '-nostats', *args]
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+class FFmpegRun:
+    """One ffmpeg child with its -progress stream parsed.
+
+    ffmpeg writes `key=value` lines and ends each report with
+    `progress=continue` (or `end`). After every report on_progress gets a
+    dict with frame, fps, out_time (seconds), speed, fraction of
+    `duration` and the ETA of this run, both None without a duration.
+
+    Progress goes to stdout unless the caller wants stdout for data
+    (stdout=subprocess.PIPE), in which case it is read from stderr. The
+    other stream is drained continuously so the child can never block on
+    a full pipe; its tail is kept for error messages.
+
+    The child's CPU time, peak RSS and I/O end up in `usage` after wait()
+    and are added to the active resource account under `stage`.
+    """
+
+    def __init__(self, cmd, duration=None, on_progress=None, stdin=None, stdout=None,
+                 register=None, unregister=None, stage=None):
+        self.data_on_stdout = stdout == subprocess.PIPE
+        self.cmd = with_progress(cmd, 'pipe:2' if self.data_on_stdout else 'pipe:1')
+        self.duration = duration
+        self.on_progress = on_progress
+        self.stdin = stdin
+        self.register = register
+        self.unregister = unregister
+        self.stage = stage
+        self.process = None
+        self.usage = None
+        self._watcher = None
+        self.last = {}
+        self._tail = deque(maxlen=STDERR_TAIL_LINES)
+        self._threads = []
+        self._started = None
+        self._span = None
+
+    def start(self):
+        self._started = time.time()
+        self._span = trace_begin(os.path.basename(self.cmd[0]), cat='subprocess', cmd=' '.join(self.cmd))
+        self.process = subprocess.Popen(
+            self.cmd, stdin=self.stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self._watcher = watch_child(self.process)
+        if self.register:
+            self.register(self.process)
+
+        progress = self.process.stderr if self.data_on_stdout else self.process.stdout
+        self._spawn(self._read_progress, progress)
+        if not self.data_on_stdout:
+            self._spawn(self._drain, self.process.stderr)
+        return self
+
+    def _spawn(self, target, stream):
+        t = threading.Thread(target=target, args=(stream,), daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _drain(self, stream):
+        for raw in iter(stream.readline, b''):
+            self._tail.append(raw)
+
+    def _read_progress(self, stream):
+        report = {}
+        for raw in iter(stream.readline, b''):
+            line = raw.decode(errors='replace').strip()
+            key, sep, value = line.partition('=')
+            if not sep or ' ' in key:
+                # Log output sharing the stream (stderr progress mode)
+                self._tail.append(raw)
+                continue
+            report[key] = value
+            if key == 'progress':
+                self._publish(report, done=value == 'end')
+                report = {}
+
+    def _publish(self, report, done=False):
+        out_time_us = _number(report.get('out_time_us') or report.get('out_time_ms'), int)
+        out_time = out_time_us / 1_000_000 if out_time_us is not None and out_time_us >= 0 else None
+        speed = _number(report.get('speed'))
+        fraction = eta = None
+        if self.duration and out_time is not None:
+            fraction = 1.0 if done else min(1.0, out_time / self.duration)
+            if speed:
+                eta = max(0.0, (self.duration - out_time) / speed)
+        self.last = {
+            'frame': _number(report.get('frame'), int),
+            'fps': _number(report.get('fps')),
+            'out_time': out_time,
+            'speed': speed,
+            'fraction': fraction,
+            'eta': eta,
+            'done': done,
+        }
+        if self.on_progress:
+            self.on_progress(self.last)
+
+    @property
+    def elapsed(self):
+        return time.time() - self._started if self._started else 0.0
+
+    def stderr_tail(self):
+        return b''.join(self._tail)
+
+    def wait(self, check=True):
+        """Wait for exit; raise CalledProcessError on failure when check"""
+        try:
+            returncode, self.usage = wait_child(self.process, self._watcher)
+            record_child(self.usage, self.stage)
+            for t in self._threads:
+                t.join()
+        finally:
+            if self.unregister:
+                self.unregister(self.process)
+            self._span.end(returncode=self.process.returncode, speed=self.last.get('speed'))
+        if check and returncode != 0:
+            raise subprocess.CalledProcessError(returncode, self.cmd, stderr=self.stderr_tail())
+        return returncode
+
+
+def run_ffmpeg(cmd, duration=None, on_progress=None, **kwargs):
+    """Run ffmpeg to completion with progress reporting"""
+    return FFmpegRun(cmd, duration, on_progress, **kwargs).start().wait()
@@ -0,0 +1,232 @@
+import os
+import re
+
+import numpy as np
+
+from tracing import span as trace_span
+from resource_usage import run as run_child
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.01
+MIN_PAUSE_SECONDS = float(os.environ.get("ALIGN_MIN_PAUSE", 0.22))
+ALIGN_VERSION = 2  # bump when alignments or confidences change
+ALIGN_MIN_CONFIDENCE = float(os.environ.get("ALIGN_MIN_CONFIDENCE", 0.6))
+# Pauses give the only timing evidence; with fewer regions than this the
+# confidence is capped proportionally
+ALIGN_MIN_REGIONS = int(os.environ.get("ALIGN_MIN_REGIONS", 4))
+
+MIN_SYLLABLE_SECONDS = 0.12
+SYLLABLE_PROMINENCE_DB = 3.0
+
+_WORD_RE = re.compile(r"\S+")
+_PHRASE_END = ('.', ',', '!', '?', ';', ':', '…', '—', '-')
+_VOWELS_RE = re.compile(r"[aeiouy]+")
+
+
+def load_pcm(audio_path):
+    """Decode audio to 16 kHz mono float32 with ffmpeg"""
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', audio_path,
+        '-f', 'f32le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1'
+    ]
+    with trace_span('ffmpeg decode', cat='subprocess', cmd=' '.join(cmd)):
+        result = run_child(cmd, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def _frame_db(samples):
+    """Energy in dB per FRAME_SECONDS frame"""
+    hop = int(SAMPLE_RATE * FRAME_SECONDS)
+    n_frames = len(samples) // hop
+    frames = samples[:n_frames * hop].reshape(n_frames, hop)
+    return 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+
+def speech_regions(samples, min_pause=MIN_PAUSE_SECONDS):
+    """(start, end) of voiced stretches separated by pauses of at least min_pause"""
+    db = _frame_db(samples)
+    if len(db) == 0:
+        return []
+
+    floor, peak = np.percentile(db, 10), np.percentile(db, 95)
+    voiced = db > floor + 0.3 * (peak - floor)
+
+    # Run-length encode the voiced mask
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = edges.reshape(-1, 2)
+    if len(runs) == 0:
+        return []
+
+    regions = [[runs[0][0], runs[0][1]]]
+    min_gap = int(min_pause / FRAME_SECONDS)
+    for start, end in runs[1:]:
+        if start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return [(s * FRAME_SECONDS, e * FRAME_SECONDS) for s, e in regions]
+
+
+def syllable_peaks(samples):
+    """Times of energy peaks, roughly one per spoken syllable.
+
+    A peak is the loudest frame of the smoothed envelope within
+    MIN_SYLLABLE_SECONDS either side, and stands SYLLABLE_PROMINENCE_DB above
+    the quietest frame there.
+    """
+    db = _frame_db(samples)
+    reach = int(MIN_SYLLABLE_SECONDS / FRAME_SECONDS)
+    if len(db) <= 2 * reach:
+        return np.zeros(0)
+    smooth = np.convolve(db, np.ones(5) / 5, mode='same')
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(smooth, reach, mode='edge'), 2 * reach + 1)
+    floor = np.percentile(db, 10)
+    is_peak = (
+        (smooth >= windows.max(axis=1))
+        & (smooth - windows.min(axis=1) >= SYLLABLE_PROMINENCE_DB)
+        & (smooth > floor + 0.3 * (np.percentile(db, 95) - floor))
+    )
+    return np.flatnonzero(is_peak) * FRAME_SECONDS
+
+
+def _syllables(word):
+    """Vowel groups in a word, less a silent final e"""
+    word = word.lower()
+    count = len(_VOWELS_RE.findall(word))
+    if count > 1 and re.search(r"[^aeiouy]e\W*$", word):
+        count -= 1
+    return max(count, 1) if any(c.isalnum() for c in word) else 0
+
+
+def content_score(syllables, peaks):
+    """0..1 agreement between the script's syllables and the envelope's peaks.
+
+    `syllables` and `peaks` are counts per region. Peak detection misses
+    and splits syllables, so the expectation is scaled by the clip-wide
+    ratio, which itself must be plausible; what is left to disagree is how
+    the script's syllables are spread over the regions, and that depends
+    on the words rather than only on the timing.
+    """
+    syllables = np.asarray(syllables, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.float64)
+    if syllables.sum() == 0:
+        return 0.0
+    ratio = peaks.sum() / syllables.sum()
+    if not 0.5 <= ratio <= 1.5:
+        return 0.0
+    expected = syllables * ratio
+    error = np.abs(peaks - expected).sum() / max(expected.sum(), 1e-6)
+    return float(max(0.0, 1.0 - error))
+
+
+def _word_weight(word):
+    # Letter count is a decent proxy for spoken length in TTS; the constant
+    # covers the onset every word has regardless of length.
+    return sum(c.isalnum() for c in word) + 2
+
+
+def _split_words(words, weights, regions):
+    """Split the word list into one contiguous group per region (DP)"""
+    n, m = len(words), len(regions)
+    durations = np.array([e - s for s, e in regions])
+    cum = np.concatenate(([0.0], np.cumsum(weights)))
+    rate = durations.sum() / cum[-1]
+    ends_phrase = [w.endswith(_PHRASE_END) for w in words]
+
+    inf = float('inf')
+    cost = np.full((m + 1, n + 1), inf)
+    back = np.zeros((m + 1, n + 1), dtype=np.int64)
+    cost[0][0] = 0.0
+    for k in range(1, m + 1):
+        # Region k needs at least one word and must leave one for each later region
+        for j in range(k, n - (m - k) + 1):
+            i = np.arange(k - 1, j)
+            expected = rate * (cum[j] - cum[i])
+            err = (durations[k - 1] - expected) / (expected + 0.3)
+            total = cost[k - 1][i] + err ** 2
+            if k < m and not ends_phrase[j - 1]:
+                total = total + 0.25
+            best = int(np.argmin(total))
+            cost[k][j] = total[best]
+            back[k][j] = i[best]
+
+    bounds = []
+    j = n
+    for k in range(m, 0, -1):
+        i = back[k][j]
+        bounds.append((i, j))
+        j = i
+    return bounds[::-1], rate
+
+
+def align_script(audio_path, script):
+    """Word timestamps for a known script, and a 0..1 confidence.
+
+    The voiceover is split into voiced regions at pauses, the script is
+    split into one group of words per region by dynamic programming
+    (favouring breaks at punctuation), and each region's words are spread
+    across it by length. Confidence falls as region durations disagree with
+    the speaking rate implied by the whole clip, and as the script's
+    syllables per region disagree with the energy peaks counted there. With
+    fewer than ALIGN_MIN_REGIONS regions it is capped, since a single region
+    fits any script.
+    """
+    words = _WORD_RE.findall(script)
+    if not words:
+        raise ValueError("Script is empty")
+
+    samples = load_pcm(audio_path)
+    regions = speech_regions(samples)
+    if not regions:
+        raise ValueError("No speech detected")
+
+    # Fewer pauses than words is the only shape the DP can fill; merge the
+    # shortest pauses until that holds.
+    while len(regions) > len(words):
+        gaps = [regions[i + 1][0] - regions[i][1] for i in range(len(regions) - 1)]
+        i = int(np.argmin(gaps))
+        regions[i:i + 2] = [(regions[i][0], regions[i + 1][1])]
+
+    weights = np.array([_word_weight(w) for w in words], dtype=np.float64)
+    bounds, rate = _split_words(words, weights, regions)
+
+    segments = []
+    errors = []
+    for (start, end), (i, j) in zip(regions, bounds):
+        group = weights[i:j]
+        expected = rate * group.sum()
+        errors.append(abs((end - start) - expected) / max(expected, 1e-6))
+
+        edges = start + (end - start) * np.concatenate(([0.0], np.cumsum(group))) / group.sum()
+        seg_words = [
+            {'word': f" {words[i + w]}", 'start': float(edges[w]), 'end': float(edges[w + 1]), 'probability': 1.0}
+            for w in range(j - i)
+        ]
+        segments.append({
+            'id': len(segments),
+            'start': float(start),
+            'end': float(end),
+            'text': ' '.join(words[i:j]),
+            'words': seg_words,
+        })
+
+    speech_seconds = sum(e - s for s, e in regions)
+    words_per_second = len(words) / max(speech_seconds, 1e-6)
+    if not 1.0 <= words_per_second <= 6.0:
+        confidence = 0.0
+    else:
+        weighted_error = np.average(errors, weights=[e - s for s, e in regions])
+        confidence = float(max(0.0, 1.0 - weighted_error))
+
+    peak_times = syllable_peaks(samples)
+    peaks = [np.count_nonzero((peak_times >= s) & (peak_times < e)) for s, e in regions]
+    syllables = [sum(_syllables(w) for w in words[i:j]) for i, j in bounds]
+    confidence = min(confidence, content_score(syllables, peaks))
+    confidence *= min(1.0, len(regions) / ALIGN_MIN_REGIONS)
+
+    result = {
+        'text': ' '.join(words),
+        'segments': segments,
+        'language': None,
+    }
+    return result, confidence
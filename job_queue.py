@@ -0,0 +1,194 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from metrics import JOBS, JOB_SECONDS
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 1))
+JOB_BACKLOG = int(os.environ.get("JOB_BACKLOG", 20))
+JOB_HISTORY = int(os.environ.get("JOB_HISTORY", 100))
+
+
+class QueueFull(Exception):
+    """Raised when the backlog limit is reached"""
+
+
+def new_job(**params):
+    return {
+        "id": uuid.uuid4().hex[:12],
+        "status": "queued",
+        "progress": 0,
+        "output": None,
+        "error": None,
+        "created_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "params": params,
+        "resources": None,
+    }
+
+
+class JobQueue:
+    """FIFO render queue drained by a fixed number of worker threads.
+
+    `handler(job)` runs the render and fills in the job's output; an
+    exception marks the job as failed. Finished jobs beyond `history` are
+    forgotten oldest first.
+
+    With a `store` (a JobStore) every state change is persisted, and
+    start() re-queues the jobs a previous process left queued or running.
+    With `events` (an EventBus) each state change is also published as a
+    "status" event on the job's id.
+    """
+
+    def __init__(self, handler, workers=RENDER_WORKERS, backlog=JOB_BACKLOG, history=JOB_HISTORY, store=None,
+                 events=None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.history = history
+        self.store = store
+        self.events = events
+        self.backlog = backlog
+        self._jobs = OrderedDict()
+        # Queued job ids in order; cancelling removes one, so it stops counting toward the backlog
+        self._waiting = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        if self.store:
+            self._recover()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"render-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, **params):
+        job = new_job(**params)
+        with self._lock:
+            if len(self._waiting) >= self.backlog:
+                raise QueueFull(f"Backlog full ({self.backlog} jobs queued)")
+            self._jobs[job["id"]] = job
+            self._waiting.append(job["id"])
+            self._available.notify()
+            self._changed(job)
+            self._prune()
+        return job
+
+    def _changed(self, job):
+        if self.store:
+            self.store.save(job)
+        if self.events:
+            self.events.publish(job["id"], "status", {
+                "status": job["status"],
+                "progress": job["progress"],
+                "error": job["error"],
+                "finished_at": job["finished_at"],
+            })
+
+    def _recover(self):
+        """Load stored jobs; interrupted ones go back on the queue in submit order"""
+        with self._lock:
+            for job in self.store.load_all():
+                self._jobs[job["id"]] = job
+                if job["status"] not in ("queued", "processing"):
+                    continue
+                job["resumed"] = job["status"] == "processing"
+                job["status"] = "queued"
+                if len(self._waiting) < self.backlog:
+                    self._waiting.append(job["id"])
+                else:
+                    job["status"] = "error"
+                    job["error"] = "Backlog full after restart"
+                    job["finished_at"] = datetime.now().isoformat()
+                self._changed(job)
+            self._prune()
+        if self._waiting:
+            print(f"🔁 Recovered {len(self._waiting)} unfinished jobs from {self.store.db_path}")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self):
+        with self._lock:
+            return next(reversed(self._jobs.values()), None)
+
+    def position(self, job_id):
+        """1-based place in the queue, or None once a worker has it"""
+        with self._lock:
+            try:
+                return self._waiting.index(job_id) + 1
+            except ValueError:
+                return None
+
+    def cancel(self, job_id):
+        """Drop a queued job, or ask a running one to stop. Returns the job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            if job["status"] == "queued":
+                self._waiting.remove(job_id)
+                job["status"] = "cancelled"
+                job["finished_at"] = datetime.now().isoformat()
+                self._changed(job)
+            elif job["status"] == "processing":
+                job["cancel_requested"] = True
+                cancel = job.get("_cancel")
+                if cancel:
+                    cancel()
+        return job
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if j["status"] == "processing")
+            return {"queued": len(self._waiting), "processing": running, "workers": self.workers}
+
+    def _prune(self):
+        finished = [jid for jid, j in self._jobs.items() if j["status"] in ("completed", "error", "cancelled")]
+        for jid in finished[:max(0, len(finished) - self.history)]:
+            job = self._jobs.pop(jid)
+            for path in (job.get("output"), job.get("trace")):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            if self.store:
+                self.store.delete(jid)
+            if self.events:
+                self.events.forget(jid)
+
+    def _worker(self):
+        while True:
+            with self._available:
+                while not self._waiting:
+                    self._available.wait()
+                job_id = self._waiting.pop(0)
+                job = self._jobs[job_id]
+                job["status"] = "processing"
+                job["started_at"] = datetime.now().isoformat()
+                self._changed(job)
+            try:
+                self.handler(job)
+                job["status"] = "completed"
+                job["progress"] = 100
+            except Exception as e:
+                if job.get("cancel_requested"):
+                    job["status"] = "cancelled"
+                    print(f"🛑 Job {job_id} cancelled")
+                else:
+                    job["status"] = "error"
+                    job["error"] = str(e)
+                    print(f"❌ Job {job_id} failed: {e}")
+            finally:
+                job.pop("_cancel", None)
+                job["finished_at"] = datetime.now().isoformat()
+                self._changed(job)
+                JOBS.inc(status=job["status"])
+                JOB_SECONDS.observe((datetime.fromisoformat(job["finished_at"]) -
+                                     datetime.fromisoformat(job["started_at"])).total_seconds(),
+                                    status=job["status"])
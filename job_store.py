@@ -0,0 +1,120 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "jobs.sqlite")
+
+FIELDS = ('id', 'status', 'progress', 'output', 'error', 'created_at', 'started_at', 'finished_at', 'params',
+          'resources')
+JSON_FIELDS = ('params', 'resources')
+UNFINISHED = ('queued', 'processing')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL,
+    output TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    params TEXT NOT NULL,
+    resources TEXT
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    key TEXT NOT NULL,
+    path TEXT,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (job_id, key)
+);
+"""
+
+
+class JobStore:
+    """Job records and per-stage checkpoints in SQLite (WAL mode).
+
+    Every status change is written through, so a restarted process can
+    list the jobs that were queued or rendering when it died. Checkpoints
+    name the stage-cache artifacts an unfinished job has completed; they
+    are kept out of cache eviction until the job finishes.
+    """
+
+    def __init__(self, db_path=JOB_STORE_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'resources' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN resources TEXT")
+
+    def save(self, job):
+        row = [json.dumps(job.get(k)) if k in JSON_FIELDS else job[k] for k in FIELDS]
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                row
+            )
+            if job['status'] not in UNFINISHED:
+                self._conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job['id'],))
+            self._conn.commit()
+
+    def delete(self, job_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+    def load_all(self):
+        """Every stored job, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(FIELDS)} FROM jobs ORDER BY created_at").fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(zip(FIELDS, row))
+            for k in JSON_FIELDS:
+                job[k] = json.loads(job[k]) if job[k] is not None else None
+            jobs.append(job)
+        return jobs
+
+    def checkpoint(self, job_id, result):
+        """Record a finished stage (a StageResult) for job_id"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (job_id, stage, key, path, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, result.name, result.key, result.path, datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def checkpoints(self, job_id):
+        """Stage names completed by job_id, in order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage FROM checkpoints WHERE job_id = ? ORDER BY created_at", (job_id,)
+            ).fetchall()
+        return [stage for stage, in rows]
+
+    def retained_paths(self):
+        """Artifacts of unfinished jobs (kept out of stage-cache eviction)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT c.path FROM checkpoints c JOIN jobs j ON j.id = c.job_id "
+                f"WHERE c.path IS NOT NULL AND j.status IN ({', '.join('?' * len(UNFINISHED))})",
+                UNFINISHED
+            ).fetchall()
+        return {os.path.abspath(path) for path, in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
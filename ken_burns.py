@@ -0,0 +1,224 @@
+import os
+import math
+import threading
+import contextvars
+from collections import OrderedDict
+
+import numpy as np
+
+from asset_catalog import IMAGE_EXTENSIONS
+from media_index import get_media_index
+from resource_usage import run as run_child
+from tracing import span as trace_span
+
+OUTPUT_WIDTH, OUTPUT_HEIGHT = 1080, 1920
+
+KEN_BURNS_ZOOM = float(os.environ.get("KEN_BURNS_ZOOM", 1.12))
+KEN_BURNS_PAN = float(os.environ.get("KEN_BURNS_PAN", 0.2))  # most a pan travels, as a fraction of the window
+KEN_BURNS_CACHE_IMAGES = int(os.environ.get("KEN_BURNS_CACHE_IMAGES", 8))
+
+MOTION_PRESETS = ('zoom_in', 'zoom_out', 'pan_left', 'pan_right', 'pan_up', 'pan_down')
+
+
+def is_image(filepath):
+    return filepath.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def encoder_input_args(fps):
+    """ffmpeg input arguments for the frames render_frames() writes to stdin"""
+    return ['-f', 'rawvideo', '-pix_fmt', 'yuv420p', '-s', f'{OUTPUT_WIDTH}x{OUTPUT_HEIGHT}',
+            '-r', str(fps), '-i', 'pipe:0']
+
+
+def _prescaled_size(width, height, zoom):
+    """Even size where the window at full zoom is exactly the output size"""
+    scale = zoom * max(OUTPUT_WIDTH / width, OUTPUT_HEIGHT / height)
+    return 2 * math.ceil(width * scale / 2), 2 * math.ceil(height * scale / 2)
+
+
+def decode_image(path, zoom=KEN_BURNS_ZOOM):
+    """(Y, U, V) float32 planes of an image, scaled once by ffmpeg.
+
+    The image is scaled so the frames only ever shrink it by at most
+    `zoom`, which plain bilinear sampling handles without aliasing.
+    """
+    info = get_media_index().lookup(path)
+    if not info['width'] or not info['height']:
+        raise ValueError(f"Cannot read image size: {path}")
+    width, height = _prescaled_size(info['width'], info['height'], zoom)
+    cmd = [
+        'ffmpeg', '-v', 'error', '-i', path, '-frames:v', '1',
+        '-vf', f'scale={width}:{height}:flags=lanczos,format=yuv420p',
+        '-f', 'rawvideo', 'pipe:1',
+    ]
+    with trace_span('ffmpeg decode image', cat='subprocess', cmd=' '.join(cmd)):
+        result = run_child(cmd, stage='segment', check=True)
+    data = np.frombuffer(result.stdout, dtype=np.uint8)
+    luma = width * height
+    chroma = luma // 4
+    if data.size != luma + 2 * chroma:
+        raise ValueError(f"Unexpected frame size decoding {path}: {data.size} bytes")
+    return (
+        data[:luma].reshape(height, width).astype(np.float32),
+        data[luma:luma + chroma].reshape(height // 2, width // 2).astype(np.float32),
+        data[luma + chroma:].reshape(height // 2, width // 2).astype(np.float32),
+    )
+
+
+class ImageCache:
+    """Decoded planes of the most recently used images, keyed by file identity"""
+
+    def __init__(self, max_images=KEN_BURNS_CACHE_IMAGES):
+        self.max_images = max_images
+        self._planes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, zoom=KEN_BURNS_ZOOM):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns, zoom)
+        with self._lock:
+            planes = self._planes.get(key)
+            if planes is not None:
+                self._planes.move_to_end(key)
+                return planes
+        planes = decode_image(path, zoom)
+        with self._lock:
+            self._planes[key] = planes
+            while len(self._planes) > self.max_images:
+                self._planes.popitem(last=False)
+        return planes
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Process-wide cache of decoded stills"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache()
+        return _default_cache
+
+
+def crop_windows(width, height, frames, motion, zoom=KEN_BURNS_ZOOM, pan=KEN_BURNS_PAN):
+    """(x, y, w, h) arrays of the source window for every frame.
+
+    The windows keep the output aspect and ease in and out (smoothstep).
+    Zooms stay centred; pans run at full zoom across at most `pan` of the
+    window, centred in the room the image leaves.
+    """
+    aspect = OUTPUT_WIDTH / OUTPUT_HEIGHT
+    if width / height > aspect:
+        base_w, base_h = height * aspect, height
+    else:
+        base_w, base_h = width, width / aspect
+
+    t = np.linspace(0.0, 1.0, frames) if frames > 1 else np.zeros(1)
+    ease = t * t * (3 - 2 * t)
+    if motion == 'zoom_in':
+        z = 1 + (zoom - 1) * ease
+    elif motion == 'zoom_out':
+        z = zoom - (zoom - 1) * ease
+    else:
+        z = np.full(frames, zoom)
+    w, h = base_w / z, base_h / z
+    x, y = (width - w) / 2, (height - h) / 2
+
+    if motion in ('pan_left', 'pan_right'):
+        travel = min(width - w[0], pan * w[0])
+        direction = 1 if motion == 'pan_right' else -1
+        x = x + direction * travel * (ease - 0.5)
+    elif motion in ('pan_up', 'pan_down'):
+        travel = min(height - h[0], pan * h[0])
+        direction = 1 if motion == 'pan_down' else -1
+        y = y + direction * travel * (ease - 0.5)
+    elif motion not in ('zoom_in', 'zoom_out'):
+        raise ValueError(f"Unknown motion preset: {motion}")
+
+    return np.clip(x, 0, width - w), np.clip(y, 0, height - h), w, h
+
+
+def _taps(starts, lengths, size, limit):
+    """Bilinear source indices and weights, one row of `size` outputs per frame"""
+    centres = (np.arange(size, dtype=np.float64) + 0.5) / size
+    pos = starts[:, None] + centres[None, :] * lengths[:, None] - 0.5
+    pos = np.clip(pos, 0, limit - 1)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, limit - 1)
+    return lo, hi, (pos - lo).astype(np.float32)
+
+
+class _PlaneSampler:
+    """Crops and resizes one plane for every frame of a window path"""
+
+    def __init__(self, plane, x, y, w, h, out_w, out_h):
+        self.plane = plane
+        self.rows = _taps(y, h, out_h, plane.shape[0])
+        self.cols = _taps(x, w, out_w, plane.shape[1])
+
+    def frame(self, i):
+        r_lo, r_hi, r_w = (a[i] for a in self.rows)
+        c_lo, c_hi, c_w = (a[i] for a in self.cols)
+        # Only the columns this window touches
+        first, last = c_lo[0], c_hi[-1] + 1
+        band = self.plane[:, first:last]
+        rows = band[r_lo] * (1 - r_w)[:, None] + band[r_hi] * r_w[:, None]
+        out = rows[:, c_lo - first] * (1 - c_w) + rows[:, c_hi - first] * c_w
+        return (out + 0.5).astype(np.uint8)
+
+
+def render_frames(path, duration, fps, motion, cache=None):
+    """yuv420p frames of a still with the given motion, as bytes"""
+    y_plane, u_plane, v_plane = (cache or get_image_cache()).get(path)
+    frames = max(1, round(duration * fps))
+    height, width = y_plane.shape
+    x, y, w, h = crop_windows(width, height, frames, motion)
+    samplers = [
+        _PlaneSampler(y_plane, x, y, w, h, OUTPUT_WIDTH, OUTPUT_HEIGHT),
+        _PlaneSampler(u_plane, x / 2, y / 2, w / 2, h / 2, OUTPUT_WIDTH // 2, OUTPUT_HEIGHT // 2),
+        _PlaneSampler(v_plane, x / 2, y / 2, w / 2, h / 2, OUTPUT_WIDTH // 2, OUTPUT_HEIGHT // 2),
+    ]
+    for i in range(frames):
+        yield b''.join(s.frame(i).tobytes() for s in samplers)
+
+
+class FrameFeeder:
+    """Writes a still's frames to an encoder's stdin on its own thread.
+
+    A killed encoder (cancel, failed render) ends the feed quietly; any
+    other failure is kept in `error`, since the encoder would otherwise
+    just see a short input and succeed.
+    """
+
+    def __init__(self, stdin, path, duration, fps, motion):
+        self.error = None
+        self._stdin = stdin
+        self._args = (path, duration, fps, motion)
+        ctx = contextvars.copy_context()
+        self._thread = threading.Thread(target=lambda: ctx.run(self._run), name="ken-burns", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        path, duration, fps, motion = self._args
+        try:
+            with trace_span('ken burns', path=os.path.basename(path), motion=motion):
+                for frame in render_frames(path, duration, fps, motion):
+                    self._stdin.write(frame)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self._stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def join(self):
+        """Wait for the feed; re-raise what stopped it early"""
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
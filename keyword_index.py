@@ -0,0 +1,70 @@
+import re
+import threading
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_TIMING_RE = re.compile(r"^\d{2}:\d{2}:\d{2},\d{3} --> ")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def srt_text(content):
+    """Only the caption lines of an SRT file (no counters or timings)"""
+    lines = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.isdigit() or _TIMING_RE.match(line):
+            continue
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class KeywordMatcher:
+    """A keyword_map compiled into a token-level inverted index.
+
+    Single-word keywords map straight to their categories; multi-word
+    keywords are indexed by their first token and confirmed against the
+    following tokens. Scoring is one pass over the transcript tokens and
+    only whole words match.
+    """
+
+    def __init__(self, keyword_map):
+        self.categories = list(keyword_map)
+        self._single = {}
+        self._phrases = {}
+        for category, keywords in keyword_map.items():
+            for keyword in keywords:
+                tokens = tuple(tokenize(keyword))
+                if not tokens:
+                    continue
+                if len(tokens) == 1:
+                    self._single.setdefault(tokens[0], []).append(category)
+                else:
+                    self._phrases.setdefault(tokens[0], []).append((tokens, category))
+
+    def score(self, text):
+        """Keyword hit count per category"""
+        scores = dict.fromkeys(self.categories, 0)
+        tokens = tokenize(text)
+        for i, token in enumerate(tokens):
+            for category in self._single.get(token, ()):
+                scores[category] += 1
+            for phrase, category in self._phrases.get(token, ()):
+                if tuple(tokens[i:i + len(phrase)]) == phrase:
+                    scores[category] += 1
+        return scores
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_keyword_matcher(keyword_map):
+    """Compiled matcher for a keyword_map, built once per distinct map"""
+    key = tuple((category, tuple(keywords)) for category, keywords in keyword_map.items())
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is None:
+            matcher = _matchers[key] = KeywordMatcher(keyword_map)
+        return matcher
@@ -1,14 +1,58 @@
 import subprocess
 import os
-import json
 import random
 import tempfile
+import threading
+import time
+
+from broll_ingest import normalize_filters, mezzanine_for
+from audio_bed import premix, input_args as mix_input_args, AUDIO_BED_DUCK_DB, AUDIO_BED_FADE
+from ken_burns import is_image, encoder_input_args, FrameFeeder, MOTION_PRESETS, KEN_BURNS_ZOOM, KEN_BURNS_PAN
+from media_index import get_media_index
+from asset_catalog import get_asset_catalog
+from whisper_pool import get_whisper_pool
+from transcription_cache import get_transcription_cache, audio_sha256
+from parallel_transcribe import transcribe_parallel, worker_pids, WHISPER_CHUNK_WORKERS
+from forced_align import align_script, ALIGN_MIN_CONFIDENCE, ALIGN_VERSION
+from keyword_index import get_keyword_matcher, srt_text
+from stage_executor import StageExecutor, file_fingerprint, stage_key, STAGE_CACHE
+from ffmpeg_runner import FFmpegRun
+from metrics import STAGE_SECONDS, ENCODE_SPEED, cache_result
+from tracing import Tracer, span as trace_span, begin as trace_begin, propagate, TRACE_RENDERS
+from resource_usage import ResourceAccount, measure as measure_usage
+
+# Pipe PASS 1 straight into PASS 3 instead of writing segment files
+STREAM_PASSES = os.environ.get("STREAM_PASSES", "off") == "on"
+
+class SegmentCancelled(Exception):
+    """Raised by a PASS 1 worker that was stopped because another segment failed"""
+
+class RenderCancelled(Exception):
+    """Raised inside create_viral_video after cancel() was called"""
 
 class ViralShortsGenerator:
-    def __init__(self, main_image, audio_path, output_path="output.mp4", niche_config=None):
+    def __init__(self, main_image, audio_path, output_path="output.mp4", niche_config=None, script_text=None, work_dir=None, seed=None, stage_cache=STAGE_CACHE, on_stage=None,
+                 on_progress=None, trace=TRACE_RENDERS):
         self.main_image = main_image
         self.audio_path = audio_path
         self.output_path = output_path
+        self.script_text = script_text
+        self.work_dir = work_dir
+        self.seed = seed  # B-roll plan and CTA choice; defaults to one derived from the audio
+        self.stage_cache = stage_cache
+        self.on_stage = on_stage  # called with each completed StageResult (job checkpoints)
+        self.on_progress = on_progress  # called with stage/overall progress, speed and ETA
+        self.trace = trace  # write a Chrome trace of the render next to the output
+        self.trace_path = None
+        self.resources = ResourceAccount()  # CPU, peak RSS and I/O per stage
+        self.stages = None
+        
+        self._active_processes = set()
+        self._process_lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._cancelled = threading.Event()
+        self._progress_lock = threading.Lock()
+        self._begin_progress({'render': 1.0})
         
         if niche_config:
             self.broll_dirs = niche_config.get('broll_dirs', {})
@@ -32,11 +76,10 @@ class ViralShortsGenerator:
                 'candle': ['light', 'truth', 'reveal', 'illuminate', 'see', 'darkness', 'flame']
             }
             
-    def _add_cta_overlay(self, video_input, output_path, duration, niche="love"):
-        filters = []
-        
+    def _cta_texts(self, niche, rng=random):
+        """(start, end) CTA lines for a niche"""
         if niche == "love":
-            start_text = random.choice([
+            start_text = rng.choice([
                 "Double tap if you felt this ❤",
                 "This hit deep... double tap ♡",
                 "Tag someone who needs this ❤",
@@ -49,7 +92,12 @@ class ViralShortsGenerator:
         else:
             start_text = "Double tap if this hit home"
             end_text = "Follow for more"
-            
+        return start_text, end_text
+    
+    def _cta_filters(self, duration, texts):
+        """drawtext filters for the CTA, applied in the final pass"""
+        start_text, end_text = texts
+        filters = []
         filters.append(
             f"drawtext=text='{start_text}':fontcolor=#FFB6FF:fontsize=52:font=Dancing Script:"
             f"borderw=3:bordercolor=#80000000:shadowx=3:shadowy=3:x=(w-text_w)/2:y=h*0.68:enable='lt(t,5)'"
@@ -58,50 +106,28 @@ class ViralShortsGenerator:
             f"drawtext=text='{end_text}':fontcolor=white:fontsize=48:font=Dancing Script:"
             f"borderw=3:bordercolor=black:shadowx=2:shadowy=2:x=(w-text_w)/2:y=h*0.75:enable='gt(t,{duration-3})'"
         )
-        
-        cmd = ['ffmpeg', '-y', '-i', video_input, '-vf', ','.join(filters), '-c:a', 'copy', output_path]
-        subprocess.run(cmd, check=True, capture_output=True)
-        print(f"✨ {niche.upper()} CTA added!")       
+        return filters
         
     def get_audio_duration(self):
         """Get audio duration in seconds"""
-        cmd = [
-            'ffprobe', '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            self.audio_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return float(result.stdout.strip())
+        duration = get_media_index().lookup(self.audio_path)['duration']
+        if duration is None:
+            raise ValueError(f"Could not read duration of {self.audio_path}")
+        return duration
     
     def get_video_info(self, filepath):
         """Get video/image dimensions and type"""
-        cmd = [
-            'ffprobe', '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'json',
-            filepath
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        try:
-            data = json.loads(result.stdout)
-            width = data['streams'][0]['width']
-            height = data['streams'][0]['height']
-            aspect_ratio = width / height
-            return width, height, aspect_ratio
-        except:
+        info = get_media_index().lookup(filepath)
+        width, height = info['width'], info['height']
+        if not width or not height:
             return None, None, None
+        return width, height, width / height
     
     def get_all_files_from_dir(self, directory):
-        """Get all VIDEO files from a directory (no images)"""
-        if not os.path.exists(directory):
+        """Get all B-roll files (videos and stills) from a directory"""
+        if not directory:
             return []
-        
-        valid_extensions = ('.mp4', '.mov', '.avi')
-        files = [os.path.join(directory, f) for f in os.listdir(directory) 
-                if f.lower().endswith(valid_extensions)]
-        return files
+        return list(get_asset_catalog().files(directory))
     
     def analyze_subtitles_for_keywords(self, srt_path):
         """Analyze subtitles and create timeline with matched categories"""
@@ -109,35 +135,15 @@ class ViralShortsGenerator:
             return list(self.broll_dirs.keys())[:3]
 
         with open(srt_path, 'r', encoding='utf-8') as f:
-            content = f.read().lower()
+            content = srt_text(f.read())
 
-        category_scores = {}
-        for category, keywords in self.keyword_map.items():
-            score = sum(content.count(keyword) for keyword in keywords)
-            category_scores[category] = score
+        category_scores = get_keyword_matcher(self.keyword_map).score(content)
 
         sorted_cats = sorted(category_scores.items(), key=lambda x: x[1], reverse=True)
         detected = [cat for cat, score in sorted_cats if score > 0]
 
-        keyword_to_folder = {
-            'hands': 'holding_hands_imgs',
-            'candle': 'romantic_candle_vids',
-            'couple': 'couple_romantic_vids',
-            'sunset': 'sunset_romantic_vids',
-            'flowers': 'romantic_flowers_vids',
-            'city': 'date_night_city_vids',
-            'book': 'old_book_pages_turning_vids',
-            'ink': 'ink_writing_vids',
-            'castle': 'medieval_castle_imgs',
-            'chess': 'chess_strategy_imgs',
-            'storm': 'storm_clouds_time_lapse_vids',
-        }
-
-        top_categories = []
-        for d in detected:
-            folder = keyword_to_folder.get(d)
-            if folder and folder in self.broll_dirs:
-                top_categories.append(folder)
+        # only categories this niche has B-roll for
+        top_categories = [d for d in detected if d in self.broll_dirs]
 
         # fallback: if nothing valid, take first 3 available folders
         if not top_categories:
@@ -146,40 +152,38 @@ class ViralShortsGenerator:
         return top_categories
 
 
-    def create_segment_plan(self, duration, top_categories):
-        """Create a plan for video segments - VIDEOS ONLY, NO IMAGES"""
+    def create_segment_plan(self, duration, top_categories, rng=random):
+        """Create a plan for B-roll segments; stills get a Ken Burns motion preset"""
         segments = []
         remaining_time = duration
         base_segment_duration = 5.0
         num_segments = int(remaining_time / base_segment_duration)
         
-        used_files = set()  # Track used files to prevent reuse
+        catalog = get_asset_catalog()
+        unused = catalog.unused(rng)  # Track used files to prevent reuse
 
         for i in range(num_segments):
             category = top_categories[i % len(top_categories)]
-            files = self.get_all_files_from_dir(self.broll_dirs.get(category, [])) 
+            directory = self.broll_dirs.get(category)
             
-            if files:
-                # Filter out already used files
-                available_files = [f for f in files if f not in used_files]
-                
+            if directory and catalog.files(directory):
                 # If all files in this category have been used, reset and allow reuse
-                if not available_files:
+                if not unused.remaining(directory):
                     print(f"  ⚠️  All files in '{category}' used, allowing reuse...")
-                    available_files = files
-                    used_files.clear()
+                    unused.reset()
                 
-                segment_duration = base_segment_duration + random.uniform(-1.5, 1.5)
-                selected_file = random.choice(available_files)
-                used_files.add(selected_file)  # Mark this file as used
+                segment_duration = base_segment_duration + rng.uniform(-1.5, 1.5)
+                selected_file = unused.pick(directory)
                 
-                if self.is_video(selected_file):
-                    segments.append({
-                        'type': 'broll',
-                        'category': category,
-                        'file': selected_file,
-                        'duration': segment_duration
-                    })
+                segment = {
+                    'type': 'broll',
+                    'category': category,
+                    'file': selected_file,
+                    'duration': segment_duration
+                }
+                if is_image(selected_file):
+                    segment['motion'] = rng.choice(MOTION_PRESETS)
+                segments.append(segment)
 
         total_duration = sum(s['duration'] for s in segments)
         if segments and total_duration < duration:
@@ -191,111 +195,304 @@ class ViralShortsGenerator:
         """Check if file is a video"""
         return filepath.lower().endswith(('.mp4', '.mov', '.avi'))
     
-    def process_segment_to_file(self, segment, output_file, fps=30, progress_callback=None):
-        """Process a single segment - VIDEOS ONLY"""
+    def process_segment_to_file(self, segment, output_file, fps=30, progress_callback=None, threads=None):
+        """Process a single segment (video clip or still)"""
         duration = segment['duration']
-        width, height, aspect = self.get_video_info(segment['file'])
         
-        cmd = ['ffmpeg', '-y', '-progress', 'pipe:1', '-nostats']
-        cmd.extend(['-i', segment['file'], '-t', str(duration)])
+        cmd = ['ffmpeg', '-y']
+        if threads:
+            cmd.extend(['-threads', str(threads)])
+        cmd.extend(self._segment_args(segment, fps))
+        cmd.append(output_file)
         
-        filters = []
+        total_frames = int(duration * fps)
         
-        if aspect and aspect < 0.7:  
-            filters.append("scale=1080:1920:force_original_aspect_ratio=decrease")
-            filters.append("pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black")
-        else:  
-            filters.append("scale=-2:1920:force_original_aspect_ratio=increase")
-            filters.append("crop=1080:1920")
+        def on_progress(info):
+            self._report(speed=info['speed'])
+            if progress_callback and info['frame']:
+                progress_callback(min(info['frame'], total_frames), total_frames)
         
-        #filters.append(f"fade=t=in:st=0:d=0.3")
-        #filters.append(f"fade=t=out:st={duration-0.3}:d=0.3")
+        still = is_image(segment['file'])
+        run = self._start_ffmpeg(cmd, duration, 'segment', on_progress=on_progress,
+                                 stdin=subprocess.PIPE if still else None)
+        feeder = self._feed_still(run, segment, fps) if still else None
+        returncode = run.wait(check=False)
+        if progress_callback and returncode == 0:
+            progress_callback(total_frames, total_frames)
+        if returncode == 0:
+            STAGE_SECONDS.observe(run.elapsed, stage='segment')
+            ENCODE_SPEED.observe(run.last.get('speed'), stage='segment')
         
-        filters.append("format=yuv420p")
+        if self._cancel_event.is_set():
+            self._check_cancelled()
+            raise SegmentCancelled(output_file)
         
-        cmd.extend(['-vf', ','.join(filters)])
-        cmd.extend([
+        if feeder:
+            feeder.join()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, run.cmd, stderr=run.stderr_tail())
+        
+        return output_file
+    
+    def _segment_args(self, segment, fps=30):
+        """Input and codec arguments for one PASS 1 segment (no output)"""
+        duration = segment['duration']
+        
+        if segment.get('mezzanine'):
+            # Already 1080x1920/yuv420p with a fixed GOP - cut from the keyframe at 0
+            return ['-i', segment['mezzanine'], '-t', str(duration), '-c', 'copy', '-an']
+        
+        if is_image(segment['file']):
+            # 1080x1920 yuv420p frames written to stdin by _feed_still()
+            input_args = encoder_input_args(fps)
+            filter_args = []
+        else:
+            width, height, aspect = self.get_video_info(segment['file'])
+            
+            filters = normalize_filters(aspect)
+            
+            #filters.append(f"fade=t=in:st=0:d=0.3")
+            #filters.append(f"fade=t=out:st={duration-0.3}:d=0.3")
+            
+            filters.append("format=yuv420p")
+            input_args = ['-i', segment['file']]
+            filter_args = ['-vf', ','.join(filters)]
+        
+        return [
+            *input_args, '-t', str(duration),
+            *filter_args,
             '-c:v', 'libx264',
             '-preset', 'ultrafast',  
             '-crf', '23',
             '-pix_fmt', 'yuv420p',
-            '-an',  
-            output_file
-        ])
+            '-an',
+        ]
+    
+    def _feed_still(self, run, segment, fps):
+        """Start writing a still segment's Ken Burns frames to its encoder"""
+        return FrameFeeder(run.process.stdin, segment['file'], segment['duration'], fps,
+                           segment.get('motion') or MOTION_PRESETS[0])
+    
+    def _attach_mezzanines(self, segments):
+        """Point every segment at its ingested mezzanine copy.
         
-        if progress_callback:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, bufsize=1)
-            total_frames = int(duration * fps)
-            last_frame = 0
-            
-            for line in process.stderr:
-                if 'frame=' in line:
-                    try:
-                        for part in line.split():
-                            if part.startswith('frame='):
-                                frame_str = part.split('=')[1]
-                                current_frame = int(frame_str)
-                                if current_frame > last_frame:
-                                    last_frame = current_frame
-                                    progress_callback(current_frame, total_frames)
-                                break
-                    except:
-                        pass
-            
-            process.wait()
-            if last_frame > 0:
-                progress_callback(total_frames, total_frames)
-            
-            if process.returncode != 0:
-                raise subprocess.CalledProcessError(process.returncode, cmd)
-        else:
-            subprocess.run(cmd, check=True, capture_output=True)
+        Stream-copied mezzanine cuts and freshly encoded segments have
+        different H.264 parameters and cannot be concatenated with -c copy,
+        so this is all-or-nothing for a plan."""
+        found = [mezzanine_for(seg['file']) for seg in segments]
+        for mezzanine in found:
+            cache_result('mezzanine', mezzanine is not None)
+        if not segments or not all(found):
+            return False
+        for seg, mezzanine in zip(segments, found):
+            seg['mezzanine'] = mezzanine
+        return True
+    
+    def _register_process(self, process):
+        """Track a running ffmpeg child so a failed PASS 1 can kill it"""
+        with self._process_lock:
+            self._active_processes.add(process)
+        if self._cancel_event.is_set():
+            process.kill()
+    
+    def _unregister_process(self, process):
+        with self._process_lock:
+            self._active_processes.discard(process)
+    
+    def _cancel_active_processes(self):
+        """Stop every segment encoder that is still running"""
+        self._cancel_event.set()
+        with self._process_lock:
+            processes = list(self._active_processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
+    
+    def cancel(self):
+        """Stop the render: kill running ffmpeg children and stop before the next pass"""
+        self._cancelled.set()
+        self._cancel_active_processes()
+    
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise RenderCancelled("Render cancelled")
+    
+    def _start_ffmpeg(self, cmd, duration=None, stage=None, on_progress=None, **kwargs):
+        """Start an ffmpeg child that cancel() can kill, reporting progress for stage"""
+        if on_progress is None:
+            def on_progress(info):
+                self._report(stage, info['fraction'], info['speed'])
+        return FFmpegRun(cmd, duration, on_progress, register=self._register_process,
+                         unregister=self._unregister_process, stage=stage, **kwargs).start()
+    
+    def _run_ffmpeg(self, cmd, duration=None, stage=None):
+        run = self._start_ffmpeg(cmd, duration, stage)
+        try:
+            returncode = run.wait()
+        except subprocess.CalledProcessError:
+            self._check_cancelled()
+            raise
+        ENCODE_SPEED.observe(run.last.get('speed'), stage=stage)
+        return returncode
+    
+    def _begin_progress(self, stages):
+        """Start overall progress tracking for stages (name -> share of the render)"""
+        total = sum(stages.values())
+        with self._progress_lock:
+            self._stage_weights = {name: weight / total for name, weight in stages.items()}
+            self._progress = {'stage': None, 'stage_progress': 0.0, 'progress': 0.0,
+                              'speed': None, 'eta': None}
+            self._done_weight = 0.0
+            self._render_start = time.time()
+    
+    def _report(self, stage=None, fraction=None, speed=None):
+        """Update stage/overall progress, encode speed and ETA, and pass them to on_progress"""
+        with self._progress_lock:
+            progress = self._progress
+            if stage and stage != progress['stage']:
+                self._done_weight += self._stage_weights.get(progress['stage'], 0.0)
+                progress['stage'] = stage
+                progress['stage_progress'] = 0.0
+            if fraction is not None:
+                progress['stage_progress'] = min(1.0, fraction)
+            if speed is not None:
+                progress['speed'] = speed
+            overall = min(1.0, self._done_weight + self._stage_weights.get(progress['stage'], 0.0) * progress['stage_progress'])
+            progress['progress'] = overall
+            elapsed = time.time() - self._render_start
+            progress['eta'] = elapsed * (1 - overall) / overall if overall >= 0.02 else None
+            snapshot = dict(progress)
+        if self.on_progress:
+            self.on_progress(snapshot)
+    
+    def _process_segments_parallel(self, segments, temp_files, fps, workers, use_tqdm, on_fraction=None, on_done=None):
+        """PASS 1 on a bounded thread pool - one ffmpeg child per worker.
         
-        return output_file
+        on_done(index) runs on the worker as soon as a segment's file is
+        complete, so finished segments survive a later failure."""
+        from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+        
+        threads_per_job = max(1, (os.cpu_count() or 1) // workers)
+        totals = [int(seg['duration'] * fps) for seg in segments]
+        done_frames = [0] * len(segments)
+        lock = threading.Lock()
+        
+        pbar = None
+        if use_tqdm:
+            from tqdm import tqdm
+            pbar = tqdm(total=sum(totals),
+                        desc=f"  {len(segments)} segments on {workers} workers",
+                        unit='frame',
+                        bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]')
+        
+        def make_callback(index):
+            def update_progress(current, total):
+                with lock:
+                    done_frames[index] = min(current, total)
+                    if pbar:
+                        pbar.n = sum(done_frames)
+                        pbar.refresh()
+                    fraction = sum(done_frames) / (sum(totals) or 1)
+                if on_fraction:
+                    on_fraction(fraction)
+            return update_progress
+        
+        def run(index):
+            if self._cancel_event.is_set():
+                self._check_cancelled()
+                raise SegmentCancelled(temp_files[index])
+            start_time = time.time()
+            callback = make_callback(index)
+            self.process_segment_to_file(segments[index], temp_files[index], fps,
+                                         progress_callback=callback, threads=threads_per_job)
+            callback(totals[index], totals[index])
+            if on_done:
+                on_done(index)
+            return time.time() - start_time
+        
+        if not self._cancelled.is_set():
+            self._cancel_event.clear()
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pass1")
+        futures = {executor.submit(propagate(run), i): i for i in range(len(segments))}
+        try:
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = [f for f in done if f.exception() and not isinstance(f.exception(), SegmentCancelled)]
+            if failed or pending:
+                self._cancel_active_processes()
+                for f in pending:
+                    f.cancel()
+                wait(pending)
+                if failed:
+                    index = futures[failed[0]]
+                    print(f"\n❌ Segment {index+1} failed, cancelled remaining workers")
+                    raise failed[0].exception()
+            if pbar:
+                pbar.n = pbar.total
+                pbar.refresh()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if pbar:
+                pbar.close()
+        
+        for f, i in sorted(futures.items(), key=lambda item: item[1]):
+            print(f"    ✓ Segment {i+1}/{len(segments)}: {os.path.basename(segments[i]['file'])[:30]} ({f.result():.1f}s)")
     
-    def generate_subtitles_with_whisper(self, model="base"):
+    def generate_subtitles_with_whisper(self, model="base", language="en", parallel=None, srt_path=None):
         """Generate subtitles using Whisper with caching"""
-        cache_file = f"{os.path.splitext(self.audio_path)[0]}_transcription.json"
+        if parallel is None:
+            parallel = WHISPER_CHUNK_WORKERS > 1
         
-        if os.path.exists(cache_file):
-            print(f"✅ Using cached transcription from {cache_file}")
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                result = json.load(f)
-        else:
-            try:
-                import whisper
-                print(f"🎤 Transcribing audio with Whisper ({model} model)...")
-                
-                if not hasattr(whisper, 'load_model'):
-                    raise ImportError("Wrong whisper package installed")
+        result = self.align_script_to_audio() if self.script_text else None
+        
+        if result is None:
+            cache = get_transcription_cache()
+            cache_key = cache.key(self.audio_path, model, language)
+            result = cache.get(cache_key)
+            cache_result('transcription', result is not None)
+        
+            if result is not None:
+                print(f"✅ Using cached transcription ({cache_key[:12]}…)")
+            else:
+                try:
+                    print(f"🎤 Transcribing audio with Whisper ({model} model)...")
                 
-                model_whisper = whisper.load_model(model)
-                result = model_whisper.transcribe(
-                    self.audio_path,
-                    word_timestamps=True,
-                    language="en"
-                )
+                    if parallel:
+                        with STAGE_SECONDS.time(stage='transcribe'), \
+                                trace_span('whisper transcribe', cat='whisper', model=model, chunked=True), \
+                                measure_usage('transcribe', workers=worker_pids):
+                            result = transcribe_parallel(self.audio_path, model, language)
+                    else:
+                        with get_whisper_pool().borrow(model) as model_whisper:
+                            with STAGE_SECONDS.time(stage='transcribe'), \
+                                    trace_span('whisper transcribe', cat='whisper', model=model), \
+                                    measure_usage('transcribe'):
+                                result = model_whisper.transcribe(
+                                    self.audio_path,
+                                    word_timestamps=True,
+                                    language=language
+                                )
                 
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=2)
-                print(f"💾 Cached transcription to {cache_file}")
+                    cache_file = cache.put(cache_key, result)
+                    print(f"💾 Cached transcription to {cache_file}")
                 
-            except (ImportError, AttributeError) as e:
-                print(f"\n❌ Whisper Error: {e}")
-                print("\n" + "="*70)
-                print("🔧 WHISPER INSTALLATION ISSUE")
-                print("="*70)
-                print("\n⚠️  You have the WRONG 'whisper' package!")
-                print("\n📝 Fix with:")
-                print("  pip uninstall whisper -y")
-                print("  pip install openai-whisper")
-                print("="*70 + "\n")
-                return None
-            except Exception as e:
-                print(f"\n❌ Error during transcription: {e}")
-                return None
-        
-        srt_path = "subtitles.srt"
+                except (ImportError, AttributeError) as e:
+                    print(f"\n❌ Whisper Error: {e}")
+                    print("\n" + "="*70)
+                    print("🔧 WHISPER INSTALLATION ISSUE")
+                    print("="*70)
+                    print("\n⚠️  You have the WRONG 'whisper' package!")
+                    print("\n📝 Fix with:")
+                    print("  pip uninstall whisper -y")
+                    print("  pip install openai-whisper")
+                    print("="*70 + "\n")
+                    return None
+                except Exception as e:
+                    print(f"\n❌ Error during transcription: {e}")
+                    return None
+        
+        srt_path = srt_path or self._work_path("subtitles.srt")
         with open(srt_path, 'w', encoding='utf-8') as f:
             counter = 1
             for segment in result['segments']:
@@ -321,6 +518,27 @@ class ViralShortsGenerator:
         print(f"✅ Subtitles saved to {srt_path}")
         return srt_path
     
+    def align_script_to_audio(self, min_confidence=ALIGN_MIN_CONFIDENCE):
+        """Word timestamps from the known script instead of full ASR"""
+        try:
+            with STAGE_SECONDS.time(stage='align'), trace_span('align script', cat='whisper'), \
+                    measure_usage('align'):
+                result, confidence = align_script(self.audio_path, self.script_text)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            print(f"⚠️  Script alignment failed ({e}), falling back to Whisper")
+            return None
+        
+        if confidence < min_confidence:
+            print(f"⚠️  Script alignment confidence {confidence:.2f} < {min_confidence:.2f}, falling back to Whisper")
+            return None
+        
+        print(f"🎯 Aligned script to voiceover (confidence {confidence:.2f}) - skipping Whisper")
+        return result
+    
+    def _work_path(self, name):
+        """Intermediate file location (the job workspace, or cwd as before)"""
+        return os.path.join(self.work_dir, name) if self.work_dir else name
+    
     def _format_srt_time(self, seconds):
         """Format seconds to SRT timestamp"""
         hours = int(seconds // 3600)
@@ -329,189 +547,446 @@ class ViralShortsGenerator:
         millis = int((seconds % 1) * 1000)
         return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
     
+    def _concat_segments(self, segment_files, output, duration=None):
+        """PASS 2: join encoded segments with the concat demuxer (stream copy)"""
+        concat_list = self._work_path(f"concat_list_{os.getpid()}_{threading.get_ident()}.txt")
+        try:
+            with open(concat_list, 'w') as f:
+                for tf in segment_files:
+                    f.write(f"file '{os.path.abspath(tf)}'\n")
+            
+            cmd = [
+                'ffmpeg', '-y',
+                '-f', 'concat',
+                '-safe', '0',
+                '-i', concat_list,
+                '-c', 'copy',
+                output
+            ]
+            self._run_ffmpeg(cmd, duration, 'concat')
+        finally:
+            if os.path.exists(concat_list):
+                os.remove(concat_list)
+        return True
+    
+    def _final_cmd(self, video_input, audio_input, srt_path, subtitle_style, output, cta_filters=()):
+        """PASS 3: burn in subtitles and the CTA over the voiceover (or the premixed audio bed)"""
+        cmd = ['ffmpeg', '-y', *video_input, *audio_input]
+        video_filters = []
+        
+        # Subtitles
+        if srt_path and os.path.exists(srt_path):
+            print(f"  📝 Adding {subtitle_style} style subtitles")
+            sub_path = srt_path.replace('\\', '/').replace(':', '\\:')
+            subtitle_styles = {
+                'love_pink': "force_style='FontName=Comic Sans MS,FontSize=16,PrimaryColour=&H00FFB6FF,OutlineColour=&H00FFFFFF,BorderStyle=1,Outline=2,Shadow=3,MarginV=130,Alignment=2,Bold=0'",
+                'cursive_elegant': "force_style='FontName=Great Vibes,FontSize=18,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BackColour=&H40000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1.5,MarginV=130,Alignment=2,Bold=0'",
+                'cursive_pink_soft': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FFB6FF,OutlineColour=&H80000000,Outline=1,Shadow=0,Blur=2,MarginV=210,Alignment=2,Bold=0'",
+                'cursive_pink_blur': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FFB6FF,OutlineColour=&H80000000,BackColour=&H25FF5588,BorderStyle=3,Outline=0.8,Shadow=0,Blur=2.5,MarginV=125,Alignment=2,Bold=0'",
+                'cursive_red_glow': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FF8888,OutlineColour=&H00FFFFFF,BackColour=&H00000000,BorderStyle=1,Outline=0,Shadow=0,Blur=3.5,MarginV=125,Alignment=2,Bold=0'",
+                'cursive_white_softpink': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BackColour=&H30FF99BB,BorderStyle=3,Outline=1,Shadow=0,Blur=2,MarginV=125,Alignment=2,Bold=0'",
+                'cursive_luxury': "force_style='FontName=Alex Brush,FontSize=18,PrimaryColour=&H00FFDDAA,OutlineColour=&H80000000,BackColour=&H35000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1.5,MarginV=130,Alignment=2,Bold=0'",
+                'handwriting_white': "force_style='FontName=Reenie Beanie,FontSize=18,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BackColour=&H30000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1,MarginV=125,Alignment=2,Bold=0'",
+                'romantic_gold': "force_style='FontName=Great Vibes,FontSize=18,PrimaryColour=&H00C19A6B,OutlineColour=&H80000000,BackColour=&H40000000,BorderStyle=3,Outline=1,Shadow=1,Blur=2,MarginV=130,Alignment=2,Bold=0'",
+                'brush_script': "force_style='FontName=Brush Script MT Italic,FontSize=17,PrimaryColour=&H00FFD700,OutlineColour=&H80000000,BackColour=&H35000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1.5,MarginV=125,Alignment=2,Bold=0'",
+            }
+            sub_style = subtitle_styles.get(subtitle_style, subtitle_styles['love_pink'])
+            video_filters.append(f"subtitles='{sub_path}':{sub_style}")
+        else:
+            print(f"  ⚠️  Skipping subtitles (not available)")
+        
+        # CTA text goes in the same graph so the video is encoded once
+        video_filters.extend(cta_filters)
+        if video_filters:
+            cmd.extend(['-vf', ','.join(video_filters)])
+        
+        # Music is mixed in by the audio_bed stage, so this is a format pass at most
+        cmd.extend([
+            '-map', '0:v',
+            '-af', 'aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo',
+            '-map', '1:a'
+        ])
+        
+        # Final encoding
+        cmd.extend([
+            '-c:v', 'libx264',
+            '-preset', 'fast',
+            '-crf', '23',
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-ar', '48000',
+            '-ac', '2',
+            '-movflags', '+faststart',
+            '-shortest',
+            output
+        ])
+        return cmd
+    
+    def _render_final(self, concat_output, audio_input, srt_path, subtitle_style, output, cta_filters=(), duration=None):
+        cmd = self._final_cmd(['-i', concat_output], audio_input, srt_path, subtitle_style, output, cta_filters)
+        self._run_ffmpeg(cmd, duration, 'final')
+        return True
+    
+    def _checked_output(self, render):
+        """Wrap a final render so a suspiciously small file fails the stage (and is never cached)"""
+        def produce(output):
+            if not render(output):
+                return False
+            file_size = os.path.getsize(output) / (1024 * 1024)
+            if file_size < 5.0:
+                print(f"\n⚠️  WARNING: Output file is suspiciously small ({file_size:.2f} MB)")
+                return False
+            return True
+        return produce
+    
+    def _premix_audio(self, bg_music, bg_volume, output):
+        """Voiceover plus the looped, ducked music bed as one 48 kHz stereo stream"""
+        try:
+            return premix(self.audio_path, bg_music, output, bg_volume,
+                          register=self._register_process, unregister=self._unregister_process)
+        except Exception:
+            self._check_cancelled()
+            raise
+    
+    def _encode_segment_stream(self, segment, offset, threads, fps=30):
+        """One segment as MPEG-TS bytes, timestamped to start at offset"""
+        if self._cancel_event.is_set():
+            self._check_cancelled()
+            raise SegmentCancelled(segment['file'])
+        cmd = ['ffmpeg', '-v', 'error', '-threads', str(threads)]
+        cmd.extend(self._segment_args(segment, fps))
+        cmd.extend(['-output_ts_offset', f"{offset:.3f}", '-f', 'mpegts', 'pipe:1'])
+        
+        still = is_image(segment['file'])
+        run = self._start_ffmpeg(cmd, segment['duration'], 'segment', on_progress=lambda info: None,
+                                 stdin=subprocess.PIPE if still else None, stdout=subprocess.PIPE)
+        feeder = self._feed_still(run, segment, fps) if still else None
+        data = run.process.stdout.read()
+        returncode = run.wait(check=False)
+        if returncode == 0:
+            STAGE_SECONDS.observe(run.elapsed, stage='segment')
+            ENCODE_SPEED.observe(run.last.get('speed'), stage='segment')
+        if self._cancel_event.is_set():
+            self._check_cancelled()
+            raise SegmentCancelled(segment['file'])
+        if feeder:
+            feeder.join()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, run.cmd, stderr=run.stderr_tail())
+        return data
+    
+    def _render_streaming(self, segments, fps, workers, final_cmd):
+        """PASS 1-3 without intermediate files.
+        
+        Up to `workers` segments are encoded ahead as MPEG-TS into memory
+        and written in plan order to the final encoder's stdin. A failed
+        segment kills the final encoder and is re-raised; a failed final
+        encoder stops the segment encoders and raises CalledProcessError.
+        """
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+        
+        threads_per_job = max(1, (os.cpu_count() or 1) // (workers + 1))
+        offsets = [sum(seg['duration'] for seg in segments[:i]) for i in range(len(segments))]
+        
+        if not self._cancelled.is_set():
+            self._cancel_event.clear()
+        run = self._start_ffmpeg(final_cmd, sum(seg['duration'] for seg in segments), 'stream', stdin=subprocess.PIPE)
+        final = run.process
+        
+        error = None
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stream")
+        window = deque()
+        try:
+            submitted = 0
+            for i, seg in enumerate(segments):
+                while submitted < len(segments) and len(window) < workers:
+                    window.append(executor.submit(propagate(self._encode_segment_stream), segments[submitted],
+                                                  offsets[submitted], threads_per_job, fps))
+                    submitted += 1
+                data = window.popleft().result()
+                final.stdin.write(data)
+                print(f"    ✓ Segment {i+1}/{len(segments)}: {os.path.basename(seg['file'])[:30]} streamed")
+        except BaseException as e:
+            error = e
+            self._cancel_active_processes()
+        finally:
+            for f in window:
+                f.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            try:
+                final.stdin.close()
+            except BrokenPipeError:
+                pass
+            returncode = run.wait(check=False)
+        
+        self._check_cancelled()
+        if returncode != 0 and (error is None or isinstance(error, (BrokenPipeError, SegmentCancelled))):
+            raise subprocess.CalledProcessError(returncode, run.cmd, stderr=run.stderr_tail())
+        if error is not None:
+            raise error
+        return True
+    
     def create_viral_video(self, auto_generate_subs=True, subtitle_style="cinematic",
-                       bg_music=None, bg_volume=0.15, fps=30):
+                       bg_music=None, bg_volume=0.15, fps=30, workers=None, stream=None):
+        options = dict(auto_generate_subs=auto_generate_subs, subtitle_style=subtitle_style, bg_music=bg_music,
+                       bg_volume=bg_volume, fps=fps, workers=workers, stream=stream)
+        token = self.resources.activate()
+        try:
+            if not self.trace:
+                return self._create_viral_video(**options)
+            return self._create_traced(options)
+        finally:
+            self.resources.deactivate(token)
+    
+    def _create_traced(self, options):
+        tracer = Tracer()
+        token = tracer.activate()
+        trace_path = os.path.splitext(self.output_path)[0] + ".trace.json"
+        try:
+            with tracer.span('render', output=self.output_path, **{k: str(v) for k, v in options.items()}):
+                return self._create_viral_video(**options)
+        finally:
+            tracer.deactivate(token)
+            self.trace_path = tracer.save(trace_path)
+            print(f"🔬 Trace written to {trace_path} (open in ui.perfetto.dev or chrome://tracing)")
+    
+    def _create_viral_video(self, auto_generate_subs, subtitle_style, bg_music, bg_volume, fps, workers, stream):
         
-        import time
         overall_start = time.time()
         
-        duration = self.get_audio_duration()
+        # Every stage below is memoized on its inputs; upstream stages feed in
+        # by key, so a change only reruns the stages downstream of it
+        self.stages = StageExecutor(enabled=self.stage_cache, scratch_dir=self.work_dir, on_stage=self.on_stage)
+        stages = self.stages
+        audio_hash = audio_sha256(self.audio_path)
+        seed = self.seed if self.seed is not None else int(audio_hash[:12], 16)
+        niche = {'broll_dirs': self.broll_dirs, 'keyword_map': self.keyword_map}
+        
+        duration = stages.value('duration', {'audio': audio_hash}, self.get_audio_duration).value
         print(f"\n{'='*70}")
         print(f"🎬 CREATING VIRAL VIDEO (FAST MODE)")
         print(f"{'='*70}")
         print(f"⏱️  Total Duration: {duration:.2f} seconds")
         print(f"⚡ Optimized for SPEED with subtle motion effects")
         
-        srt_path = None
-        if auto_generate_subs:
-            if os.path.exists('subtitles.srt'):
-                print(f"✅ Using existing subtitles.srt")
-                srt_path = 'subtitles.srt'
-            else:
-                srt_path = self.generate_subtitles_with_whisper()
-                if not srt_path:
-                    print(f"⚠️  Continuing without subtitles...")
-        
-        print(f"\n🧠 Analyzing content for smart B-roll matching...")
-        top_categories = self.analyze_subtitles_for_keywords(srt_path) if srt_path else list(self.broll_dirs.keys())[:3]
-        print(f"📊 Top themes detected: {', '.join(top_categories)}")
-        
-        segments = self.create_segment_plan(duration, top_categories)
-        
-        print(f"\n📋 VIDEO SEGMENTS PLAN:")
-        print(f"{'='*70}")
-        for i, seg in enumerate(segments):
-            w, h, aspect = self.get_video_info(seg['file'])
-            ratio = f"{w}x{h}" if w else "unknown"
-            print(f"  {i+1}. B-roll ({seg['duration']:.1f}s) - {seg['category']} - {os.path.basename(seg['file'])} [{ratio}]")
+        if stream is None:
+            stream = STREAM_PASSES
+        # Rough share of render time per stage, for overall progress and ETA
+        if stream:
+            self._begin_progress({'subtitles': 1, 'stream': 9})
+        else:
+            self._begin_progress({'subtitles': 1, 'pass1': 5, 'concat': 0.5, 'final': 3.5})
         
-        print(f"\n🎬 PASS 1: Processing {len(segments)} segments (FAST)...")
         temp_files = []
-        concat_list = "concat_list.txt"
-        concat_output = "concatenated_video.mp4"
         
         try:
-            try:
-                from tqdm import tqdm
-                use_tqdm = True
-            except ImportError:
-                use_tqdm = False
+            srt_path = None
+            subs_key = None
+            self._report('subtitles', 0.0)
+            if auto_generate_subs:
+                subs = stages.artifact('subtitles', {
+                    'audio': audio_hash,
+                    'script': self.script_text,
+                    'min_confidence': ALIGN_MIN_CONFIDENCE,
+                    'aligner': ALIGN_VERSION,
+                    'model': 'base',
+                    'language': 'en',
+                }, lambda out: self.generate_subtitles_with_whisper(srt_path=out), '.srt')
+                srt_path, subs_key = subs.path, subs.key if subs.path else None
+                if subs.cached:
+                    print(f"✅ Using cached subtitles ({subs.key[:12]}…)")
+                elif not srt_path:
+                    print(f"⚠️  Continuing without subtitles...")
             
-            for i, seg in enumerate(segments):
-                temp_file = f"temp_segment_{i:02d}.mp4"
-                start_time = time.time()
-                
-                if use_tqdm:
-                    total_frames = int(seg['duration'] * fps)
-                    pbar = tqdm(total=total_frames, 
-                            desc=f"  Segment {i+1}/{len(segments)}: {os.path.basename(seg['file'])[:30]}", 
-                            unit='frame',
-                            bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]')
-                    
-                    def update_progress(current, total):
-                        pbar.n = min(current, total)
-                        pbar.refresh()
-                    
-                    try:
-                        self.process_segment_to_file(seg, temp_file, fps, progress_callback=update_progress)
-                    finally:
-                        pbar.n = pbar.total 
-                        pbar.refresh()
-                        pbar.close()
-                        elapsed = time.time() - start_time
-                        print(f"    ✓ Done in {elapsed:.1f}s")
-                else:
-                    print(f"  Processing segment {i+1}/{len(segments)}: {os.path.basename(seg['file'])}", end='', flush=True)
-                    self.process_segment_to_file(seg, temp_file, fps)
-                    elapsed = time.time() - start_time
-                    print(f" ✓ ({elapsed:.1f}s)")
-                
-                temp_files.append(temp_file)
+            self._report(fraction=1.0)
             
-            print(f"\n🎬 PASS 2: Concatenating {len(temp_files)} segments...")
-            concat_start = time.time()
+            print(f"\n🧠 Analyzing content for smart B-roll matching...")
+            top_categories = stages.value(
+                'keywords', {'subtitles': subs_key, 'niche': niche},
+                lambda: self.analyze_subtitles_for_keywords(srt_path) if srt_path else list(self.broll_dirs.keys())[:3]
+            ).value
+            print(f"📊 Top themes detected: {', '.join(top_categories)}")
             
-            with open(concat_list, 'w') as f:
-                for tf in temp_files:
-                    f.write(f"file '{tf}'\n")
+            catalog = get_asset_catalog()
+            assets = {c: catalog.files(self.broll_dirs.get(c)) for c in top_categories if self.broll_dirs.get(c)}
+            segments = stages.value(
+                'plan', {'duration': duration, 'categories': top_categories, 'niche': niche, 'assets': assets, 'seed': seed},
+                lambda: self.create_segment_plan(duration, top_categories, rng=random.Random(seed))
+            ).value
             
-            if use_tqdm:
-                print("  Merging segments...", end='', flush=True)
+            print(f"\n📋 VIDEO SEGMENTS PLAN:")
+            print(f"{'='*70}")
+            for i, seg in enumerate(segments):
+                w, h, aspect = self.get_video_info(seg['file'])
+                ratio = f"{w}x{h}" if w else "unknown"
+                kind = f"Still, {seg['motion']}" if seg.get('motion') else "B-roll"
+                print(f"  {i+1}. {kind} ({seg['duration']:.1f}s) - {seg['category']} - {os.path.basename(seg['file'])} [{ratio}]")
             
-            cmd = [
-                'ffmpeg', '-y',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_list,
-                '-c', 'copy',
-                concat_output
-            ]
-            subprocess.run(cmd, check=True, capture_output=True)
-            concat_elapsed = time.time() - concat_start
+            if self._attach_mezzanines(segments):
+                print(f"📦 All segments found in mezzanine cache - stream copy cuts")
             
-            if use_tqdm:
-                print(f" ✓ ({concat_elapsed:.1f}s)")
-            else:
-                print(f"  ✓ Concatenation complete ({concat_elapsed:.1f}s)")
+            seg_inputs = []
+            for seg in segments:
+                inputs = {
+                    'file': file_fingerprint(seg['file']),
+                    'mezzanine': file_fingerprint(seg.get('mezzanine')),
+                    'duration': seg['duration'],
+                    'fps': fps,
+                }
+                if seg.get('motion'):
+                    # One encode per (image, duration, motion preset)
+                    inputs['motion'] = [seg['motion'], KEN_BURNS_ZOOM, KEN_BURNS_PAN]
+                seg_inputs.append(inputs)
+            # Same key whether the segments go through files or pipes
+            concat_key = stage_key('concat', {'segments': [stage_key('segment', inputs) for inputs in seg_inputs]})
             
-            # PASS 3: Add subtitles + audio
-            print(f"\n🎬 PASS 3: Adding subtitles, audio, and music...")
-            final_start = time.time()
+            if workers is None:
+                workers = int(os.environ.get("PASS1_WORKERS", 0)) or max(1, (os.cpu_count() or 1) // 4)
             
-            cmd = ['ffmpeg', '-y', '-i', concat_output, '-i', self.audio_path]
+            audio_input = ['-i', self.audio_path]
+            bed_key = None
             if bg_music and os.path.exists(bg_music):
-                cmd.extend(['-i', bg_music])
-                print(f"  🎵 Including background music")
-            
-            # Subtitles
-            if srt_path and os.path.exists(srt_path):
-                print(f"  📝 Adding {subtitle_style} style subtitles")
-                sub_path = srt_path.replace('\\', '/').replace(':', '\\:')
-                subtitle_styles = {
-                    'love_pink': "force_style='FontName=Comic Sans MS,FontSize=16,PrimaryColour=&H00FFB6FF,OutlineColour=&H00FFFFFF,BorderStyle=1,Outline=2,Shadow=3,MarginV=130,Alignment=2,Bold=0'",
-                    'cursive_elegant': "force_style='FontName=Great Vibes,FontSize=18,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BackColour=&H40000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1.5,MarginV=130,Alignment=2,Bold=0'",
-                    'cursive_pink_soft': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FFB6FF,OutlineColour=&H80000000,Outline=1,Shadow=0,Blur=2,MarginV=210,Alignment=2,Bold=0'",
-                    'cursive_pink_blur': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FFB6FF,OutlineColour=&H80000000,BackColour=&H25FF5588,BorderStyle=3,Outline=0.8,Shadow=0,Blur=2.5,MarginV=125,Alignment=2,Bold=0'",
-                    'cursive_red_glow': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FF8888,OutlineColour=&H00FFFFFF,BackColour=&H00000000,BorderStyle=1,Outline=0,Shadow=0,Blur=3.5,MarginV=125,Alignment=2,Bold=0'",
-                    'cursive_white_softpink': "force_style='FontName=Dancing Script,FontSize=17,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BackColour=&H30FF99BB,BorderStyle=3,Outline=1,Shadow=0,Blur=2,MarginV=125,Alignment=2,Bold=0'",
-                    'cursive_luxury': "force_style='FontName=Alex Brush,FontSize=18,PrimaryColour=&H00FFDDAA,OutlineColour=&H80000000,BackColour=&H35000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1.5,MarginV=130,Alignment=2,Bold=0'",
-                    'handwriting_white': "force_style='FontName=Reenie Beanie,FontSize=18,PrimaryColour=&H00FFFFFF,OutlineColour=&H80000000,BackColour=&H30000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1,MarginV=125,Alignment=2,Bold=0'",
-                    'romantic_gold': "force_style='FontName=Great Vibes,FontSize=18,PrimaryColour=&H00C19A6B,OutlineColour=&H80000000,BackColour=&H40000000,BorderStyle=3,Outline=1,Shadow=1,Blur=2,MarginV=130,Alignment=2,Bold=0'",
-                    'brush_script': "force_style='FontName=Brush Script MT Italic,FontSize=17,PrimaryColour=&H00FFD700,OutlineColour=&H80000000,BackColour=&H35000000,BorderStyle=3,Outline=1,Shadow=1,Blur=1.5,MarginV=125,Alignment=2,Bold=0'",
+                self._check_cancelled()
+                print(f"\n🎵 Preparing background music bed...")
+                bed_start = time.time()
+                bed_inputs = {
+                    'audio': audio_hash,
+                    'bg_music': file_fingerprint(bg_music),
+                    'bg_volume': bg_volume,
+                    'duck': [AUDIO_BED_DUCK_DB, AUDIO_BED_FADE],
                 }
-                sub_style = subtitle_styles.get(subtitle_style, subtitle_styles['love_pink'])
-                vf = f"subtitles='{sub_path}':{sub_style}"
-                cmd.extend(['-vf', vf])
-            else:
-                print(f"  ⚠️  Skipping subtitles (not available)")
+                with measure_usage('audio_bed'):
+                    bed = stages.artifact('audio_bed', bed_inputs,
+                                          lambda out: self._premix_audio(bg_music, bg_volume, out), '.f32')
+                if bed.path:
+                    audio_input = mix_input_args(bed.path)
+                    bed_key = bed.key
+                state = "cached" if bed.cached else f"{time.time() - bed_start:.1f}s"
+                print(f"  ✓ Music looped, ducked and premixed ({state})")
             
-            if bg_music and os.path.exists(bg_music):
-                filter_complex = (
-                    f'[1:a]aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo,volume=1.0[voice];'
-                    f'[2:a]aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo,volume={bg_volume},aloop=loop=-1:size=2e+09[bg];'
-                    f'[voice][bg]amix=inputs=2:duration=first:dropout_transition=2,aresample=48000[aout]'
-                )
-                cmd.extend([
-                    '-filter_complex', filter_complex,
-                    '-map', '0:v',
-                    '-map', '[aout]'
-                ])
+            cta_niche = top_categories[0]
+            cta_texts = self._cta_texts(cta_niche, rng=random.Random(seed))
+            cta_filters = self._cta_filters(duration, cta_texts)
+            final_inputs = {
+                'concat': concat_key,
+                'audio': audio_hash,
+                'subtitles': subs_key,
+                'style': subtitle_style,
+                'audio_bed': bed_key,
+                'cta': cta_filters,
+            }
+            
+            try:
+                from tqdm import tqdm
+                use_tqdm = True
+            except ImportError:
+                use_tqdm = False
+            
+            if stream:
+                self._report('stream', 0.0)
+                workers = max(1, min(workers, len(segments) or 1))
+                self._check_cancelled()
+                print(f"\n🎬 PASS 1-3: Streaming {len(segments)} segments into the final encoder (x{workers}, no temp files)...")
+                final_start = time.time()
+                final = stages.artifact('final', final_inputs, self._checked_output(lambda out: self._render_streaming(
+                    segments, fps, workers,
+                    self._final_cmd(['-f', 'mpegts', '-i', 'pipe:0'], audio_input, srt_path, subtitle_style, out, cta_filters)
+                )), '.mp4')
             else:
-                cmd.extend([
-                    '-map', '0:v',
-                    '-af', 'aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo',
-                    '-map', '1:a'
-                ])
+                seg_results = [stages.lookup('segment', inputs, '.mp4') for inputs in seg_inputs]
+                todo = [i for i, result in enumerate(seg_results) if not result.cached]
+                workers = max(1, min(workers, len(todo) or 1))
+                
+                mode = f"PARALLEL x{workers}" if workers > 1 else "FAST"
+                print(f"\n🎬 PASS 1: Processing {len(segments)} segments ({mode})...")
+                if len(todo) < len(segments):
+                    print(f"  ♻️  {len(segments) - len(todo)} segments reused from stage cache")
+                
+                # Reused segments count as done
+                reused = len(segments) - len(todo)
+                pass1_share = lambda fraction: self._report('pass1', (reused + fraction * len(todo)) / (len(segments) or 1))
+                pass1_share(0.0)
             
-            # Final encoding
-            cmd.extend([
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
-                '-c:a', 'aac',
-                '-b:a', '192k',
-                '-ar', '48000',
-                '-ac', '2',
-                '-movflags', '+faststart',
-                '-shortest',
-                self.output_path
-            ])
+                self._check_cancelled()
+                pass1_span = trace_begin('pass1', segments=len(todo), workers=workers)
+                if workers > 1:
+                    temp_files = [self._work_path(f"temp_segment_{i:02d}.mp4") for i in todo]
+                    pass1_start = time.time()
+                    # Each segment goes into the stage cache as soon as it is done, like the serial loop
+                    self._process_segments_parallel([segments[i] for i in todo], temp_files, fps, workers, use_tqdm,
+                                                    on_fraction=pass1_share,
+                                                    on_done=lambda k: stages.store(seg_results[todo[k]], temp_files[k]))
+                    print(f"  ✓ PASS 1 complete ({time.time() - pass1_start:.1f}s)")
+                else:
+                    for done, i in enumerate(todo):
+                        seg = segments[i]
+                        self._check_cancelled()
+                        temp_file = self._work_path(f"temp_segment_{i:02d}.mp4")
+                        temp_files.append(temp_file)
+                        start_time = time.time()
+                    
+                        if use_tqdm:
+                            total_frames = int(seg['duration'] * fps)
+                            pbar = tqdm(total=total_frames, 
+                                    desc=f"  Segment {i+1}/{len(segments)}: {os.path.basename(seg['file'])[:30]}", 
+                                    unit='frame',
+                                    bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]')
+                        
+                            def update_progress(current, total):
+                                pbar.n = min(current, total)
+                                pbar.refresh()
+                                pass1_share((done + current / total) / len(todo))
+                        
+                            try:
+                                self.process_segment_to_file(seg, temp_file, fps, progress_callback=update_progress)
+                            finally:
+                                pbar.n = pbar.total 
+                                pbar.refresh()
+                                pbar.close()
+                                elapsed = time.time() - start_time
+                                print(f"    ✓ Done in {elapsed:.1f}s")
+                        else:
+                            print(f"  Processing segment {i+1}/{len(segments)}: {os.path.basename(seg['file'])}", end='', flush=True)
+                            self.process_segment_to_file(seg, temp_file, fps,
+                                                         progress_callback=lambda current, total: pass1_share((done + current / total) / len(todo)))
+                            elapsed = time.time() - start_time
+                            print(f" ✓ ({elapsed:.1f}s)")
+                    
+                        stages.store(seg_results[i], temp_file)
+                pass1_span.end()
+            
+                self._check_cancelled()
+                print(f"\n🎬 PASS 2: Concatenating {len(segments)} segments...")
+                concat_start = time.time()
+                self._report('concat', 0.0)
+                concat = stages.artifact('concat', {'segments': [r.key for r in seg_results]},
+                                         lambda out: self._concat_segments([r.path for r in seg_results], out, duration), '.mp4')
+                state = "cached" if concat.cached else f"{time.time() - concat_start:.1f}s"
+                print(f"  ✓ Concatenation complete ({state})")
             
-            subprocess.run(cmd, check=True, capture_output=True)
-            final_elapsed = time.time() - final_start
-            print(f"  ✓ Final video complete ({final_elapsed:.1f}s)")
+                # PASS 3: Add subtitles + CTA + audio
+                self._check_cancelled()
+                print(f"\n🎬 PASS 3: Adding subtitles, CTA, audio, and music...")
+                final_start = time.time()
+                self._report('final', 0.0)
+                final = stages.artifact('final', final_inputs, self._checked_output(lambda out: self._render_final(
+                    concat.path, audio_input, srt_path, subtitle_style, out, cta_filters=cta_filters, duration=duration
+                )), '.mp4')
+            if not final.path:
+                return False
+            self._report(fraction=1.0)
+            state = "cached" if final.cached else f"{time.time() - final_start:.1f}s"
+            print(f"  ✓ Final video with {cta_niche.upper()} CTA complete ({state})")
             
             cta_output = self.output_path.replace(".mp4", "_cta.mp4")
-            self._add_cta_overlay(self.output_path, cta_output, duration, niche=top_categories[0])
+            stages.export(final, cta_output)
             self.output_path = cta_output
         
             total_time = time.time() - overall_start
             file_size = os.path.getsize(self.output_path) / (1024 * 1024)
             
-            if file_size < 5.0:
-                print(f"\n⚠️  WARNING: Output file is suspiciously small ({file_size:.2f} MB)")
-                return False
-            
+            reused, ran = stages.summary()
             print(f"\n{'='*70}")
             print(f"✅ VIRAL VIDEO READY WITH CTA!")
             print(f"{'='*70}")
@@ -521,6 +996,7 @@ class ViralShortsGenerator:
             print(f"⚡ Processing Time: {total_time:.1f}s ({total_time/60:.1f} min)")
             print(f"🎨 Segments: {len(segments)} clips with subtle motion")
             print(f"🎯 Themes: {', '.join(top_categories)}")
+            print(f"♻️  Stages reused: {', '.join(reused) or 'none'} | ran: {', '.join(ran) or 'none'}")
             if not srt_path:
                 print(f"⚠️  Note: Video created WITHOUT subtitles")
             print(f"\n🚀 Ready to GO VIRAL on TikTok/Shorts/Reels!")
@@ -535,13 +1011,11 @@ class ViralShortsGenerator:
         
         finally:
             print(f"\n🧹 Cleaning up temporary files...")
+            # Finished segments were moved into the stage cache; only partial ones remain
             for tf in temp_files:
                 if os.path.exists(tf):
                     os.remove(tf)
-            if os.path.exists(concat_list):
-                os.remove(concat_list)
-            if os.path.exists(concat_output):
-                os.remove(concat_output)
+            stages.release()
 
 
 NICHE_TEMPLATES = {
@@ -645,8 +1119,6 @@ def main():
     audio = "Audio_Voice/new_love.mp3"
     output = "new_love.mp4"
     bg_music = "bg_musics/For_Dating.mp3"
-    subtitle_file = "subtitles.srt" 
-    new_love_trascription_file = "Audio_Voice/new_love_transcription.json"
     # ===================================
     
     if not os.path.exists(main_image):
@@ -674,14 +1146,6 @@ def main():
         fps=30
     )
     
-    if success and os.path.exists(subtitle_file):
-        try:
-            os.remove(subtitle_file)
-            os.remove(new_love_trascription_file)
-            print(f"🗑 Deleted temporary subtitle file: {subtitle_file} & {new_love_trascription_file}")
-        except Exception as e:
-            print(f"⚠ Failed to delete subtitle file: {e}")
-    
     if success:
         print("✅ Subtle zoom adds professional touch without heavy processing!")
         print("="*70)
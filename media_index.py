@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import cache_result
+from tracing import span as trace_span
+from resource_usage import run as run_child
+from workspace import SCRATCH_ROOT, TMPFS_ROOT
+
+MEDIA_INDEX_PATH = os.environ.get("MEDIA_INDEX_PATH", "media_index.sqlite")
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+MEDIA_EXTENSIONS = VIDEO_EXTENSIONS + ('.mp3', '.wav', '.m4a', '.jpg', '.jpeg', '.png')
+
+FIELDS = ('width', 'height', 'duration', 'fps', 'codec', 'pix_fmt', 'keyframes')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    duration REAL,
+    fps REAL,
+    codec TEXT,
+    pix_fmt TEXT,
+    keyframes INTEGER
+)
+"""
+
+
+def _parse_rate(rate):
+    try:
+        num, den = rate.split('/')
+        return float(num) / float(den) if float(den) else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def probe_file(filepath, count_keyframes=False):
+    """Run ffprobe once and return every indexed field for a media file"""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-show_entries',
+        'format=duration:stream=codec_type,codec_name,width,height,pix_fmt,avg_frame_rate,nb_read_frames',
+        '-of', 'json',
+    ]
+    if count_keyframes:
+        cmd.extend(['-skip_frame', 'nokey', '-count_frames'])
+    cmd.append(filepath)
+    with trace_span('ffprobe', cat='subprocess', cmd=' '.join(cmd)):
+        result = run_child(cmd, stage='probe', text=True)
+
+    info = dict.fromkeys(FIELDS)
+    try:
+        data = json.loads(result.stdout)
+    except ValueError:
+        return info
+
+    duration = data.get('format', {}).get('duration')
+    info['duration'] = float(duration) if duration not in (None, 'N/A') else None
+
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    stream = video or (streams[0] if streams else {})
+    info['codec'] = stream.get('codec_name')
+    if video:
+        info['width'] = video.get('width')
+        info['height'] = video.get('height')
+        info['pix_fmt'] = video.get('pix_fmt')
+        info['fps'] = _parse_rate(video.get('avg_frame_rate'))
+        if count_keyframes and str(video.get('nb_read_frames', '')).isdigit():
+            info['keyframes'] = int(video['nb_read_frames'])
+    return info
+
+
+def _in_workspace(path):
+    return any(path.startswith(os.path.abspath(root) + os.sep) for root in (SCRATCH_ROOT, TMPFS_ROOT))
+
+
+class MediaIndex:
+    """Persistent ffprobe results keyed by path + size + mtime.
+
+    All rows are loaded into memory on open, so lookups for unchanged files
+    cost a stat() and no subprocess. Misses are probed and written through.
+    Files in job workspaces are probed but never stored (each job's copy
+    has a new path), and rows for files that are gone are dropped on open.
+    """
+
+    def __init__(self, db_path=MEDIA_INDEX_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._rows = {}
+        missing = []
+        for row in self._conn.execute(f"SELECT path, size, mtime, {', '.join(FIELDS)} FROM probes"):
+            if os.path.exists(row[0]):
+                self._rows[row[0]] = (row[1], row[2], dict(zip(FIELDS, row[3:])))
+            else:
+                missing.append((row[0],))
+        if missing:
+            self._conn.executemany("DELETE FROM probes WHERE path = ?", missing)
+            self._conn.commit()
+
+    def _cached(self, path, st):
+        row = self._rows.get(path)
+        if row and row[0] == st.st_size and row[1] == st.st_mtime:
+            return row[2]
+        return None
+
+    def _store(self, entries):
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO probes (path, size, mtime, {', '.join(FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(FIELDS))})",
+                [(path, size, mtime, *(info[k] for k in FIELDS)) for path, size, mtime, info in entries]
+            )
+            self._conn.commit()
+            for path, size, mtime, info in entries:
+                self._rows[path] = (size, mtime, info)
+
+    def lookup(self, filepath):
+        """Probe info for a file, from memory when the file is unchanged"""
+        path = os.path.abspath(filepath)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return dict.fromkeys(FIELDS)
+        if _in_workspace(path):
+            return probe_file(path)
+        info = self._cached(path, st)
+        cache_result('media_index', info is not None)
+        if info is None:
+            info = probe_file(path)
+            self._store([(path, st.st_size, st.st_mtime, info)])
+        return info
+
+    def index_directory(self, directory, workers=None, count_keyframes=True):
+        """Probe every new or changed media file in a directory in one pass"""
+        if not os.path.isdir(directory):
+            return 0
+        stale = []
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(MEDIA_EXTENSIONS):
+                continue
+            path = os.path.abspath(os.path.join(directory, name))
+            st = os.stat(path)
+            info = self._cached(path, st)
+            wants_keyframes = count_keyframes and name.lower().endswith(VIDEO_EXTENSIONS)
+            if info is None or (wants_keyframes and info['keyframes'] is None):
+                stale.append((path, st, wants_keyframes))
+        if not stale:
+            return 0
+
+        workers = workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            infos = list(executor.map(lambda item: probe_file(item[0], item[2]), stale))
+        self._store([(path, st.st_size, st.st_mtime, info) for (path, st, _), info in zip(stale, infos)])
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_media_index():
+    """Process-wide index at MEDIA_INDEX_PATH"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = MediaIndex()
+        return _default_index
+
+
+if __name__ == "__main__":
+    directories = sys.argv[1:]
+    if not directories:
+        from main import NICHE_TEMPLATES
+        directories = sorted({d for t in NICHE_TEMPLATES.values() for d in t['broll_dirs'].values()})
+    index = get_media_index()
+    for directory in directories:
+        count = index.index_directory(directory)
+        print(f"🔎 {directory}: {count} files probed")
+    print(f"✅ Media index at {index.db_path}")
@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition format 0.0.4, no client library needed
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+SPEED_BUCKETS = (0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 20, 50)
+BYTES_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 2, 5, 10, 20, 50, 100, 200, 500))
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('_total', key, (), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Set directly, or computed at scrape time by `function` (returns {label values: value})"""
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=(), function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function:
+            values = self.function()
+            if not isinstance(values, dict):
+                values = {(): values}
+            items = sorted((tuple(str(v) for v in k), v) for k, v in values.items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [('', key, (), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        if value is None:
+            return
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        out = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append(('_bucket', key, (('le', _format_value(float(bound)) if bound != math.inf else '+Inf'),), cumulative))
+            out.append(('_sum', key, (), total))
+            out.append(('_count', key, (), count))
+        return out
+
+
+def render():
+    """Every registered metric in exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(m.render() for m in metrics) + '\n'
+
+
+STAGE_SECONDS = Histogram(
+    'render_stage_seconds', 'Wall time of a pipeline stage that had to run (cache misses only)', ['stage'])
+ENCODE_SPEED = Histogram(
+    'render_encode_speed', 'ffmpeg encode speed as a multiple of realtime', ['stage'], buckets=SPEED_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'render_cache_requests', 'Cache lookups by cache and result (hit/miss)', ['cache', 'result'])
+OUTPUT_BYTES = Histogram(
+    'render_output_bytes', 'Size of finished videos', buckets=BYTES_BUCKETS)
+JOBS = Counter('render_jobs', 'Finished jobs by final status', ['status'])
+JOB_SECONDS = Histogram('render_job_seconds', 'Wall time of a job from start to finish', ['status'])
+
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
@@ -0,0 +1,178 @@
+import os
+import re
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from tracing import span as trace_span
+from resource_usage import run as run_child
+
+SAMPLE_RATE = 16000  # whisper.audio.SAMPLE_RATE
+
+WHISPER_CHUNK_WORKERS = int(os.environ.get("WHISPER_CHUNK_WORKERS", 0))
+TARGET_CHUNK_SECONDS = float(os.environ.get("WHISPER_CHUNK_SECONDS", 30))
+MIN_CHUNK_SECONDS = 8.0
+
+_SILENCE_RE = re.compile(r"silence_(start|end): (-?[\d.]+)")
+
+_worker_model = None
+
+
+def find_silences(audio_path, noise_db=-35, min_silence=0.35):
+    """(start, end) of every silent stretch, from ffmpeg silencedetect"""
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostats', '-i', audio_path,
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}',
+        '-f', 'null', '-'
+    ]
+    with trace_span('ffmpeg silencedetect', cat='subprocess', cmd=' '.join(cmd)):
+        result = run_child(cmd, check=True, text=True)
+    silences = []
+    start = None
+    for kind, value in _SILENCE_RE.findall(result.stderr):
+        if kind == 'start':
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+def plan_chunks(duration, silences, target=TARGET_CHUNK_SECONDS, min_chunk=MIN_CHUNK_SECONDS):
+    """Split [0, duration] at the last silence midpoint before every `target` seconds"""
+    cut_candidates = [(s + e) / 2 for s, e in silences]
+    cuts = [0.0]
+    while duration - cuts[-1] > target + min_chunk:
+        goal = cuts[-1] + target
+        usable = [c for c in cut_candidates if cuts[-1] + min_chunk <= c <= duration - min_chunk]
+        if not usable:
+            break
+        # Stay inside one 30 s Whisper window when a silence allows it
+        before = [c for c in usable if c <= goal]
+        cut = max(before) if before else min(usable)
+        if cut <= cuts[-1]:
+            break
+        cuts.append(cut)
+    cuts.append(duration)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def _init_worker(model_name, threads, pid_queue):
+    global _worker_model
+    pid_queue.put(os.getpid())
+    import torch
+    import whisper
+    torch.set_num_threads(threads)
+    _worker_model = whisper.load_model(model_name)
+
+
+def _transcribe_chunk(audio, language):
+    return _worker_model.transcribe(audio, word_timestamps=True, language=language)
+
+
+def stitch_results(results, offsets):
+    """Shift chunk timestamps back onto the full-audio timeline"""
+    segments = []
+    texts = []
+    for result, offset in zip(results, offsets):
+        texts.append(result.get('text', '').strip())
+        for seg in result.get('segments', []):
+            seg = dict(seg)
+            seg['id'] = len(segments)
+            seg['start'] = seg['start'] + offset
+            seg['end'] = seg['end'] + offset
+            seg['words'] = [
+                {**w, 'start': w['start'] + offset, 'end': w['end'] + offset}
+                for w in seg.get('words', [])
+            ]
+            segments.append(seg)
+    return {
+        'text': ' '.join(t for t in texts if t),
+        'segments': segments,
+        'language': results[0].get('language') if results else None,
+    }
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+# Pool key -> (queue the workers report their pid on, pids seen so far)
+_worker_pids = {}
+
+
+def _get_executor(model_name, workers):
+    """Worker processes are kept between jobs so each loads its model once"""
+    key = (model_name, workers)
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is None:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            context = multiprocessing.get_context("spawn")
+            pid_queue = context.Queue()
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(model_name, threads, pid_queue),
+            )
+            _executors[key] = executor
+            _worker_pids[key] = (pid_queue, set())
+        return executor
+
+
+def _discard_executor(model_name, workers, executor):
+    """Forget a broken pool so the next call starts a fresh one"""
+    key = (model_name, workers)
+    with _executors_lock:
+        if _executors.get(key) is executor:
+            del _executors[key]
+            _worker_pids.pop(key, None)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def worker_pids():
+    """Pids of the pool processes (for resource accounting)"""
+    pids = []
+    with _executors_lock:
+        for pid_queue, seen in _worker_pids.values():
+            while True:
+                try:
+                    seen.add(pid_queue.get_nowait())
+                except queue.Empty:
+                    break
+            pids.extend(seen)
+    return pids
+
+
+def transcribe_parallel(audio_path, model_name="base", language="en", workers=None):
+    """Transcribe silence-bounded chunks of the audio on a process pool.
+
+    Returns a result in the same shape as whisper's transcribe() with
+    word_timestamps=True, with every timestamp relative to the whole file.
+    """
+    import whisper
+
+    workers = workers or WHISPER_CHUNK_WORKERS or max(1, (os.cpu_count() or 1) // 2)
+    audio = whisper.load_audio(audio_path)
+    duration = len(audio) / SAMPLE_RATE
+    chunks = plan_chunks(duration, find_silences(audio_path))
+    print(f"🎤 Transcribing {len(chunks)} chunks on {min(workers, len(chunks))} processes...")
+
+    # A worker killed mid-job (e.g. OOM) breaks the whole pool; start over once on a new one
+    for attempt in range(2):
+        executor = _get_executor(model_name, workers)
+        try:
+            futures = [
+                executor.submit(_transcribe_chunk, audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], language)
+                for start, end in chunks
+            ]
+            results = [f.result() for f in futures]
+            break
+        except BrokenProcessPool:
+            _discard_executor(model_name, workers, executor)
+            if attempt:
+                raise
+            print(f"⚠️  Whisper worker pool broke, restarting it...")
+    return stitch_results(results, [start for start, _ in chunks])
@@ -0,0 +1,324 @@
+import os
+import sys
+import threading
+import subprocess
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+RSS_SAMPLE_INTERVAL = float(os.environ.get("RSS_SAMPLE_INTERVAL", 0.1))
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_HAS_PROC = os.path.exists('/proc/self/status')
+
+_current = contextvars.ContextVar("resource_account", default=None)
+_stage = contextvars.ContextVar("resource_stage", default=None)
+
+
+def _read_io(pid='self'):
+    """Bytes read/written through read()/write() (pipes included), from /proc"""
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _read_rss(pid='self'):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _read_hwm(pid):
+    """Peak RSS of a live process (VmHWM), from /proc; None until it has exec'd"""
+    try:
+        # Until exec a vforked child still shows our memory
+        if os.readlink(f'/proc/{pid}/exe') == os.readlink('/proc/self/exe'):
+            return None
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+def _read_cpu(pid):
+    """(user, sys) CPU seconds of a live process, from /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the parenthesised command name; utime/stime are 14 and 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[11]) / _CLOCK_TICKS, int(fields[12]) / _CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _sample_workers(pids):
+    """{pid: (user, sys, read, write)} of helper processes that are still alive"""
+    samples = {}
+    for pid in pids:
+        cpu, io = _read_cpu(pid), _read_io(pid)
+        if cpu is not None:
+            samples[pid] = (*cpu, *(io or (0, 0)))
+    return samples
+
+
+def _maxrss_bytes(ru):
+    # kB on Linux, bytes on macOS
+    return ru.ru_maxrss if sys.platform == 'darwin' else ru.ru_maxrss * 1024
+
+
+class ChildWatcher:
+    """Polls a child's peak RSS from spawn until wait_child() reaps it"""
+
+    def __init__(self, process):
+        self.pid = process.pid
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-watch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        delay = 0.005
+        while True:
+            self.sample()
+            if self._stop.wait(delay):
+                return
+            delay = min(delay * 2, RSS_SAMPLE_INTERVAL)
+
+    def sample(self):
+        hwm = _read_hwm(self.pid)
+        if hwm is not None:
+            self.peak = max(self.peak or 0, hwm)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def watch_child(process):
+    """Start sampling a child spawned while an account is active (else None)"""
+    if resource is None or _current.get() is None:
+        return None
+    return ChildWatcher(process)
+
+
+def wait_child(process, watcher=None):
+    """Reap a Popen child like process.wait() and return (returncode, usage).
+
+    The child is waited for without reaping first (waitid WNOWAIT) so its
+    /proc I/O counters can still be read, then reaped with wait4 for its
+    CPU times. Peak RSS is VmHWM polled while it runs: a child's ru_maxrss
+    starts from the parent's RSS at fork, which would charge every ffmpeg
+    with the memory of the loaded Whisper models. Pass the watch_child()
+    watcher when the caller reads the child's output to EOF before waiting;
+    otherwise the child is polled here. usage is None where none of this
+    is available, or when no account is active and nobody watched it.
+    """
+    unwatched = watcher is None and _current.get() is None
+    if resource is None or not hasattr(os, 'waitid') or process.returncode is not None or unwatched:
+        if watcher:
+            watcher.stop()
+        return process.wait(), None
+    watcher = watcher or ChildWatcher(process)
+    try:
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        watcher.stop()
+        io = _read_io(process.pid)
+        _, status, ru = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        watcher.stop()
+        # Reaped elsewhere (e.g. a concurrent poll() from kill())
+        return process.wait(), None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if io is None:
+        io = (ru.ru_inblock * 512, ru.ru_oublock * 512)
+    return process.returncode, {
+        'cpu_user': ru.ru_utime,
+        'cpu_sys': ru.ru_stime,
+        # A child gone before it could be sampled reads 0 rather than our RSS
+        'peak_rss': (watcher.peak or 0) if _HAS_PROC else _maxrss_bytes(ru),
+        'read_bytes': io[0],
+        'write_bytes': io[1],
+    }
+
+
+class ResourceAccount:
+    """CPU time, peak RSS and I/O of one render, aggregated per stage.
+
+    Child processes are measured exactly (wait4 rusage plus /proc/<pid>/io
+    read before reaping). In-process work such as Whisper is measured by
+    sampling /proc/self over the measured block, plus any long-lived helper
+    processes it names (the Whisper chunk pool); those figures are
+    process-wide, so renders running concurrently in the same process are
+    included. Nested measurements and children reaped inside a block are
+    subtracted from it, so nothing is counted twice within one account.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._attributed = [0.0, 0.0, 0, 0]  # cpu_user, cpu_sys, read_bytes, write_bytes
+        self._child_io = [0, 0]
+        self._lock = threading.Lock()
+
+    def add(self, stage, usage, processes=0):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {
+                'processes': 0, 'cpu_user': 0.0, 'cpu_sys': 0.0,
+                'peak_rss': 0, 'read_bytes': 0, 'write_bytes': 0,
+            })
+            entry['processes'] += processes
+            entry['cpu_user'] += usage['cpu_user']
+            entry['cpu_sys'] += usage['cpu_sys']
+            entry['peak_rss'] = max(entry['peak_rss'], usage['peak_rss'] or 0)
+            entry['read_bytes'] += usage['read_bytes']
+            entry['write_bytes'] += usage['write_bytes']
+
+    def add_child(self, stage, usage):
+        with self._lock:
+            self._child_io[0] += usage['read_bytes']
+            self._child_io[1] += usage['write_bytes']
+        self.add(stage, usage, processes=1)
+
+    def _totals(self):
+        with self._lock:
+            return list(self._attributed), list(self._child_io)
+
+    @contextmanager
+    def measure(self, stage, workers=None):
+        """Attribute in-process work of the with-block to stage.
+
+        workers() may return the pids of helper processes (not our direct,
+        reaped children) whose CPU, memory and I/O belong to the block.
+        """
+        if resource is None:
+            yield
+            return
+        workers = workers or (lambda: ())
+        token = _stage.set(stage)
+
+        def rss():
+            return (_read_rss() or 0) + sum(_read_rss(pid) or 0 for pid in workers())
+
+        peak = [rss()]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(RSS_SAMPLE_INTERVAL):
+                peak[0] = max(peak[0], rss())
+
+        sampler = threading.Thread(target=sample, name="rss-sampler", daemon=True)
+        sampler.start()
+        ru_start, io_start = resource.getrusage(resource.RUSAGE_SELF), _read_io()
+        workers_start = _sample_workers(workers())
+        attributed_start, child_start = self._totals()
+        try:
+            yield
+        finally:
+            ru_end, io_end = resource.getrusage(resource.RUSAGE_SELF), _read_io()
+            workers_end = _sample_workers(workers())
+            # Workers started inside the block count from zero
+            helper = [sum(end[i] - workers_start.get(pid, (0, 0, 0, 0))[i] for pid, end in workers_end.items())
+                      for i in range(4)]
+            stop.set()
+            sampler.join()
+            _stage.reset(token)
+            attributed_end, child_end = self._totals()
+            inner = [end - start for start, end in zip(attributed_start, attributed_end)]
+            child = [end - start for start, end in zip(child_start, child_end)]
+            io = [end - start for start, end in zip(io_start, io_end)] if io_start and io_end else [0, 0]
+            own = [
+                max(0.0, ru_end.ru_utime - ru_start.ru_utime - inner[0]),
+                max(0.0, ru_end.ru_stime - ru_start.ru_stime - inner[1]),
+                max(0, io[0] - inner[2] - child[0]),
+                max(0, io[1] - inner[3] - child[1]),
+            ]
+            # Only our own share is inside an enclosing block's /proc/self figures
+            with self._lock:
+                for i, value in enumerate(own):
+                    self._attributed[i] += value
+            self.add(stage, {
+                'cpu_user': own[0] + helper[0],
+                'cpu_sys': own[1] + helper[1],
+                # Without /proc, the process lifetime peak is the best there is
+                'peak_rss': max(peak[0], rss()) or _maxrss_bytes(ru_end),
+                'read_bytes': own[2] + helper[2],
+                'write_bytes': own[3] + helper[3],
+            })
+
+    def activate(self):
+        return _current.set(self)
+
+    def deactivate(self, token):
+        _current.reset(token)
+
+    def snapshot(self):
+        """{stage: figures} plus a 'total' entry; CPU in seconds, memory/I/O in MB"""
+        with self._lock:
+            stages = {name: dict(entry) for name, entry in self._stages.items()}
+        total = {'processes': 0, 'cpu_user': 0.0, 'cpu_sys': 0.0, 'peak_rss': 0, 'read_bytes': 0, 'write_bytes': 0}
+        for entry in stages.values():
+            for key in total:
+                total[key] = max(total[key], entry[key]) if key == 'peak_rss' else total[key] + entry[key]
+        stages['total'] = total
+        return {name: _format(entry) for name, entry in stages.items()}
+
+
+def _format(entry):
+    mb = 1024 * 1024
+    return {
+        'processes': entry['processes'],
+        'cpu_user_s': round(entry['cpu_user'], 2),
+        'cpu_sys_s': round(entry['cpu_sys'], 2),
+        'peak_rss_mb': round(entry['peak_rss'] / mb, 1),
+        'read_mb': round(entry['read_bytes'] / mb, 1),
+        'write_mb': round(entry['write_bytes'] / mb, 1),
+    }
+
+
+def current():
+    return _current.get()
+
+
+def measure(stage, workers=None):
+    """Measure the with-block into the active account, or a no-op"""
+    account = _current.get()
+    return account.measure(stage, workers) if account else nullcontext()
+
+
+def record_child(usage, stage=None):
+    """Add a reaped child's usage to the active account (stage defaults to the enclosing measure)"""
+    account = _current.get()
+    if account and usage:
+        account.add_child(stage or _stage.get() or 'other', usage)
+
+
+def run(cmd, stage=None, check=False, text=False):
+    """subprocess.run(cmd, capture_output=True) that records the child's usage"""
+    if _current.get() is None:
+        return subprocess.run(cmd, capture_output=True, check=check, text=text)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=text)
+    watcher = ChildWatcher(process)
+    stderr = []
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    reader.start()
+    stdout = process.stdout.read()
+    reader.join()
+    process.stdout.close()
+    process.stderr.close()
+    returncode, usage = wait_child(process, watcher)
+    record_child(usage, stage)
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr[0])
+    return subprocess.CompletedProcess(cmd, returncode, stdout, stderr[0])
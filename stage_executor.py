@@ -0,0 +1,309 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from metrics import STAGE_SECONDS, cache_result
+from tracing import span as trace_span
+
+STAGE_CACHE = os.environ.get("STAGE_CACHE", "on") != "off"
+STAGE_CACHE_DIR = os.environ.get("STAGE_CACHE_DIR", "stage_cache")
+STAGE_CACHE_BYTES = int(os.environ.get("STAGE_CACHE_BYTES", 5 * 1024 * 1024 * 1024))
+# Artifact stages never copied into STAGE_CACHE_DIR: they live in the job's
+# scratch dir only. The concat is a stream copy, cheaper to redo than to store.
+STAGE_SCRATCH_ONLY = {s.strip() for s in os.environ.get("STAGE_SCRATCH_ONLY", "concat").split(',') if s.strip()}
+
+# Bump when a stage's output format changes so old entries stop matching
+STAGE_CACHE_VERSION = 1
+
+# key -> [lock, holders and waiters]; an entry lives only while someone uses it
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+# Artifacts some render still needs; eviction leaves them alone
+_pinned = Counter()
+_cache_lock = threading.Lock()
+
+# Callables returning more paths to keep (e.g. artifacts of interrupted jobs)
+_retention_hooks = []
+
+
+@contextmanager
+def _lock_for(key):
+    """Hold the per-key lock; the entry is dropped once nobody holds or waits for it"""
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+def register_retention(hook):
+    """Keep every path hook() returns out of eviction"""
+    _retention_hooks.append(hook)
+
+
+def file_fingerprint(path):
+    """Cheap identity of an input file: path, size and mtime (None if missing)"""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.abspath(path), st.st_size, st.st_mtime_ns]
+
+
+def stage_key(name, inputs):
+    """Hash of a stage's name and inputs; upstream stages feed in by their key"""
+    payload = json.dumps([STAGE_CACHE_VERSION, name, inputs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class StageResult:
+    def __init__(self, name, key, value=None, path=None, cached=False):
+        self.name = name
+        self.key = key
+        self.value = value
+        self.path = path
+        self.cached = cached
+
+
+class StageExecutor:
+    """Memoizes pipeline stages by a hash of their inputs.
+
+    A stage's inputs include the keys of the stages it depends on, so a
+    changed input invalidates that stage and everything downstream of it
+    while earlier results are reused. JSON-able results are stored as
+    `<key>.json`, file artifacts as `<key><ext>`, both in cache_dir with
+    least recently used entries evicted past max_bytes.
+
+    Artifacts are always produced in scratch_dir (the job's workspace,
+    often tmpfs) and only finished ones are moved into cache_dir. Stages in
+    scratch_only, and every stage with enabled=False, are never reused:
+    they stay in scratch_dir and are removed again by release().
+
+    on_stage(result) is called for every completed or reused stage, which
+    is how a job records its checkpoints.
+    """
+
+    def __init__(self, cache_dir=STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_BYTES, enabled=STAGE_CACHE,
+                 scratch_dir=None, on_stage=None, scratch_only=STAGE_SCRATCH_ONLY):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.scratch_dir = scratch_dir or '.'
+        self.scratch_only = set(scratch_only)
+        self.on_stage = on_stage
+        self.log = []
+        self._held = []
+        self._produced = []
+
+    def _caches(self, name):
+        return self.enabled and name not in self.scratch_only
+
+    def _path(self, name, key, ext):
+        if self._caches(name):
+            return os.path.join(self.cache_dir, f"{key}{ext}")
+        return os.path.join(self.scratch_dir, f"{name}-{key[:12]}{ext}")
+
+    def _record(self, result, started):
+        elapsed = time.time() - started
+        self.log.append((result.name, result.cached, elapsed))
+        if self._caches(result.name):
+            cache_result('stage', result.cached)
+        if not result.cached:
+            STAGE_SECONDS.observe(elapsed, stage=result.name)
+        if result.path or result.value is not None:
+            self._checkpoint(result)
+        return result
+
+    def _checkpoint(self, result):
+        if self._caches(result.name) and self.on_stage:
+            self.on_stage(result)
+
+    def _hold(self, path):
+        """Pin a cached path for this render and mark it recently used"""
+        with _cache_lock:
+            if not os.path.exists(path):
+                return False
+            _pinned[path] += 1
+            self._held.append(path)
+        os.utime(path)
+        return True
+
+    def value(self, name, inputs, compute):
+        """Result of compute(), reused while inputs are unchanged"""
+        with trace_span(f"stage {name}") as span:
+            result = self._value(name, inputs, compute)
+            span.args['cached'] = result.cached
+        return result
+
+    def _value(self, name, inputs, compute):
+        started = time.time()
+        key = stage_key(name, inputs)
+        if not self.enabled:
+            return self._record(StageResult(name, key, value=compute()), started)
+
+        path = self._path(name, key, '.json')
+        with _lock_for(key):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)['value']
+                os.utime(path)
+                return self._record(StageResult(name, key, value=value, cached=True), started)
+            except (OSError, ValueError, KeyError):
+                pass
+
+            value = compute()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'stage': name, 'value': value}, f)
+            os.replace(tmp, path)
+            self._evict()
+        return self._record(StageResult(name, key, value=value), started)
+
+    def lookup(self, name, inputs, ext):
+        """Cached artifact for these inputs, or a miss whose path store() fills"""
+        result = self._lookup(name, inputs, ext)
+        if self._caches(name):
+            cache_result('stage', result.cached)
+        if result.cached:
+            self._checkpoint(result)
+        return result
+
+    def store(self, result, produced_path):
+        """Move a freshly produced file into result's cache slot"""
+        path = self._store(result, produced_path)
+        self._checkpoint(result)
+        return path
+
+    def _lookup(self, name, inputs, ext):
+        key = stage_key(name, inputs)
+        path = self._path(name, key, ext)
+        cached = self._caches(name) and self._hold(path)
+        return StageResult(name, key, path=path, cached=cached)
+
+    def _store(self, result, produced_path):
+        if produced_path != result.path:
+            os.makedirs(os.path.dirname(result.path) or '.', exist_ok=True)
+            # Unique name so two renders producing the same key cannot collide
+            tmp = f"{result.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.move(produced_path, tmp)
+            os.replace(tmp, result.path)
+        if self._caches(result.name):
+            self._hold(result.path)
+            self._evict()
+        else:
+            self._produced.append(result.path)
+        return result.path
+
+    def artifact(self, name, inputs, produce, ext):
+        """File made by produce(path), reused while inputs are unchanged.
+
+        produce must write the file at the path it is given and return a
+        truthy value; a falsy return means the stage failed and nothing is
+        stored (result.path is None).
+        """
+        with trace_span(f"stage {name}") as span:
+            result = self._artifact(name, inputs, produce, ext)
+            span.args['cached'] = result.cached
+        return result
+
+    def _artifact(self, name, inputs, produce, ext):
+        started = time.time()
+        result = self._lookup(name, inputs, ext)
+        if result.cached:
+            return self._record(result, started)
+
+        with _lock_for(result.key):
+            # Another render may have produced it while we waited
+            if self._caches(name) and self._hold(result.path):
+                result.cached = True
+                return self._record(result, started)
+
+            # Written where the job's other temporaries are; only a finished
+            # file is moved into the cache
+            os.makedirs(self.scratch_dir, exist_ok=True)
+            tmp = os.path.join(self.scratch_dir, f"{name}-{result.key[:12]}.{os.getpid()}.{threading.get_ident()}.part{ext}")
+            try:
+                ok = produce(tmp)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            if not ok or not os.path.exists(tmp):
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                result.path = None
+                return self._record(result, started)
+            self._store(result, tmp)
+        return self._record(result, started)
+
+    def export(self, result, dest):
+        """Put an artifact at dest: a hard link when possible, else a copy"""
+        if os.path.exists(dest):
+            os.remove(dest)
+        os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+        try:
+            os.link(result.path, dest)
+        except OSError:
+            shutil.copyfile(result.path, dest)
+        return dest
+
+    def summary(self):
+        reused = [name for name, cached, _ in self.log if cached]
+        ran = [name for name, cached, _ in self.log if not cached]
+        return reused, ran
+
+    def release(self):
+        """Unpin this render's artifacts (and delete them when not caching)"""
+        with _cache_lock:
+            for path in self._held:
+                _pinned[path] -= 1
+                if _pinned[path] <= 0:
+                    del _pinned[path]
+            self._held = []
+        for path in self._produced:
+            if os.path.exists(path):
+                os.remove(path)
+        self._produced = []
+
+    def _evict(self):
+        retained = set()
+        for hook in _retention_hooks:
+            retained |= hook()
+        with _cache_lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.tmp') or '.part.' in name:
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path in _pinned or os.path.abspath(path) in retained:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+TRACE_RENDERS = os.environ.get("TRACE_RENDERS", "off") == "on"
+
+_current = contextvars.ContextVar("tracer", default=None)
+
+
+class Span:
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.tid = threading.get_ident()
+        self.start = tracer._now()
+
+    def end(self, **args):
+        self.args.update(args)
+        self.tracer._complete(self)
+
+
+class _NullSpan:
+    def __init__(self):
+        self.args = {}
+
+    def end(self, **args):
+        pass
+
+
+class Tracer:
+    """Collects nested spans as Chrome trace events ("X" complete events).
+
+    Spans are per thread and nest by time, which is how chrome://tracing
+    and Perfetto draw them. Use activate() so code that does not hold a
+    reference (media probes, Whisper, ffmpeg runs) can find the tracer
+    through tracing.span() and tracing.begin().
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def _now(self):
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _complete(self, span):
+        event = {
+            "name": span.name, "cat": span.cat, "ph": "X",
+            "ts": span.start, "dur": self._now() - span.start,
+            "pid": self.pid, "tid": span.tid, "args": span.args,
+        }
+        with self._lock:
+            self._events.append(event)
+            if span.tid not in self._threads:
+                self._threads[span.tid] = threading.current_thread().name
+
+    def begin(self, name, cat="stage", **args):
+        return Span(self, name, cat, args)
+
+    @contextmanager
+    def span(self, name, cat="stage", **args):
+        span = self.begin(name, cat, **args)
+        try:
+            yield span
+        except BaseException as e:
+            span.args["error"] = repr(e)
+            raise
+        finally:
+            span.end()
+
+    def activate(self):
+        return _current.set(self)
+
+    def deactivate(self, token):
+        _current.reset(token)
+
+    def save(self, path):
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        meta = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                for tid, name in threads.items()]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + sorted(events, key=lambda e: e["ts"]),
+                       "displayTimeUnit": "ms"}, f)
+        os.replace(tmp, path)
+        return path
+
+
+def current():
+    return _current.get()
+
+
+def span(name, cat="stage", **args):
+    """Span on the active tracer, or a no-op"""
+    tracer = _current.get()
+    return tracer.span(name, cat, **args) if tracer else nullcontext(_NullSpan())
+
+
+def begin(name, cat="stage", **args):
+    """Open span to end() later on the active tracer, or a no-op"""
+    tracer = _current.get()
+    return tracer.begin(name, cat, **args) if tracer else _NullSpan()
+
+
+def propagate(fn):
+    """fn bound to the caller's context, for running on pool threads"""
+    ctx = contextvars.copy_context()
+    # A context can only be entered by one thread at a time, so each call gets a copy
+    return lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs)
@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import threading
+
+TRANSCRIPTION_CACHE_DIR = os.environ.get("TRANSCRIPTION_CACHE_DIR", "transcription_cache")
+TRANSCRIPTION_CACHE_BYTES = int(os.environ.get("TRANSCRIPTION_CACHE_BYTES", 256 * 1024 * 1024))
+
+
+def audio_sha256(audio_path, chunk_size=1024 * 1024):
+    """SHA-256 of the audio bytes"""
+    digest = hashlib.sha256()
+    with open(audio_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """Whisper results keyed by audio content, model and language.
+
+    Entries are JSON files in cache_dir. Reads refresh the file's mtime and
+    writes evict least recently used entries until the directory fits in
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir=TRANSCRIPTION_CACHE_DIR, max_bytes=TRANSCRIPTION_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, audio_path, model, language):
+        return f"{audio_sha256(audio_path)}_{model}_{language or 'auto'}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                return None
+            os.utime(path)
+        return result
+
+    def put(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        with self._lock:
+            os.replace(tmp, path)
+            self._evict(keep=path)
+        return path
+
+    def _evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_transcription_cache():
+    """Process-wide transcription cache"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TranscriptionCache()
+        return _default_cache
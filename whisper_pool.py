@@ -0,0 +1,176 @@
+import os
+import gc
+import time
+import threading
+from contextlib import contextmanager
+
+from metrics import STAGE_SECONDS
+from tracing import span as trace_span
+from resource_usage import measure as measure_usage
+
+WHISPER_MODELS = [m.strip() for m in os.environ.get("WHISPER_MODELS", "base").split(",") if m.strip()]
+WHISPER_POOL_SIZE = int(os.environ.get("WHISPER_POOL_SIZE", 1))
+WHISPER_IDLE_TIMEOUT = float(os.environ.get("WHISPER_IDLE_TIMEOUT", 900))
+
+
+def load_whisper_model(name):
+    """Load an openai-whisper model (raises ImportError for the wrong package)"""
+    import whisper
+    if not hasattr(whisper, 'load_model'):
+        raise ImportError("Wrong whisper package installed")
+    with STAGE_SECONDS.time(stage='whisper_load'), trace_span('whisper load', cat='whisper', model=name), \
+            measure_usage('whisper_load'):
+        return whisper.load_model(name)
+
+
+class _ModelSlot:
+    def __init__(self):
+        self.idle = []
+        self.loaded = 0
+        self.borrowed = 0
+        self.last_used = time.time()
+
+
+class WhisperModelPool:
+    """Whisper models kept resident between jobs.
+
+    Up to `size` instances per model name are loaded (in the background by
+    warm_up, or lazily on first borrow). Jobs borrow an instance and hand it
+    back; instances nobody has borrowed for `idle_timeout` seconds are
+    dropped to give the memory back.
+    """
+
+    def __init__(self, models=None, size=WHISPER_POOL_SIZE, idle_timeout=WHISPER_IDLE_TIMEOUT, loader=load_whisper_model):
+        self.models = list(models or WHISPER_MODELS)
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.loader = loader
+        self._slots = {}
+        self._cond = threading.Condition()
+        self._warmed = threading.Event()
+        self._warmup_error = None
+        self._warmup_started = False
+        self._reaper = None
+
+    def _slot(self, name):
+        slot = self._slots.get(name)
+        if slot is None:
+            slot = self._slots[name] = _ModelSlot()
+        return slot
+
+    @property
+    def ready(self):
+        return self._warmed.is_set() and self._warmup_error is None
+
+    def start_warmup(self):
+        """Load the configured models on a background thread"""
+        self._warmup_started = True
+        threading.Thread(target=self._warm_up, name="whisper-warmup", daemon=True).start()
+        self._start_reaper()
+
+    def _warm_up(self):
+        try:
+            for name in self.models:
+                start = time.time()
+                with self.borrow(name):
+                    pass
+                print(f"🎤 Whisper '{name}' model loaded ({time.time() - start:.1f}s)")
+        except Exception as e:
+            self._warmup_error = str(e)
+            print(f"❌ Whisper warm-up failed: {e}")
+        finally:
+            self._warmed.set()
+
+    def wait_ready(self, timeout=None):
+        return self._warmed.wait(timeout)
+
+    @contextmanager
+    def borrow(self, name):
+        """Hand out a loaded model, loading one if the pool is below its size"""
+        with self._cond:
+            slot = self._slot(name)
+            while not slot.idle and slot.loaded >= self.size:
+                self._cond.wait()
+            if slot.idle:
+                model = slot.idle.pop()
+            else:
+                model = None
+                slot.loaded += 1
+            slot.borrowed += 1
+
+        if model is None:
+            try:
+                model = self.loader(name)
+            except BaseException:
+                with self._cond:
+                    slot.loaded -= 1
+                    slot.borrowed -= 1
+                    self._cond.notify_all()
+                raise
+
+        try:
+            yield model
+        finally:
+            with self._cond:
+                slot.idle.append(model)
+                slot.borrowed -= 1
+                slot.last_used = time.time()
+                self._cond.notify_all()
+
+    def _start_reaper(self):
+        if self.idle_timeout <= 0 or (self._reaper and self._reaper.is_alive()):
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name="whisper-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        interval = min(60.0, self.idle_timeout / 2)
+        while True:
+            time.sleep(interval)
+            self.release_idle()
+
+    def release_idle(self, max_idle=None):
+        """Drop models that have not been borrowed for max_idle seconds"""
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        released = []
+        with self._cond:
+            now = time.time()
+            for name, slot in self._slots.items():
+                if slot.idle and not slot.borrowed and now - slot.last_used >= max_idle:
+                    slot.loaded -= len(slot.idle)
+                    slot.idle.clear()
+                    released.append(name)
+        if released:
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+            print(f"💤 Released idle Whisper models: {', '.join(released)}")
+        return released
+
+    def status(self):
+        with self._cond:
+            models = {name: {'loaded': slot.loaded, 'in_use': slot.borrowed}
+                      for name, slot in self._slots.items()}
+        return {
+            'ready': self.ready,
+            'warming_up': self._warmup_started and not self._warmed.is_set(),
+            'error': self._warmup_error,
+            'models': models,
+        }
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_whisper_pool():
+    """Process-wide Whisper model pool"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = WhisperModelPool()
+        return _default_pool
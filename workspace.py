@@ -0,0 +1,190 @@
+import subprocess
+import os
+import shutil
+import atexit
+import tempfile
+import threading
+
+SCRATCH_ROOT = os.environ.get("SCRATCH_ROOT", os.path.join(tempfile.gettempdir(), "viral_shorts"))
+TMPFS_ROOT = os.environ.get("TMPFS_ROOT", "/dev/shm")
+# off: always disk; auto: /dev/shm when it has room; mount: a private tmpfs per job
+SCRATCH_TMPFS = os.environ.get("SCRATCH_TMPFS", "auto")
+
+WORKSPACE_PREFIX = "job_"
+
+# PASS 1 segments, the concatenated copy and the final render are each
+# roughly one ultrafast/fast 1080x1920 encode of the whole duration.
+BYTES_PER_SECOND = 3 * 12_000_000 // 8
+BASE_BYTES = 64 * 1024 * 1024
+
+_active = set()
+_active_lock = threading.Lock()
+
+
+def estimate_job_bytes(duration):
+    """Scratch space a render of `duration` seconds needs"""
+    return int(BASE_BYTES + duration * BYTES_PER_SECOND)
+
+
+def _boot_id():
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip().replace('-', '')[:12]
+    except OSError:
+        return ''
+
+
+_BOOT_ID = _boot_id()
+
+
+def _start_id(pid):
+    """Boot id + start time of a process, '' where /proc cannot say.
+
+    A pid alone is reused: in a container the server gets the same low pid
+    on every start, so a killed run's workspaces would look live forever.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Field 22 (starttime); the command name before ')' may contain spaces
+            start = f.read().rpartition(')')[2].split()[19]
+    except (OSError, IndexError):
+        return ''
+    return f"{_BOOT_ID}{start}" if _BOOT_ID else ''
+
+
+def _owner(pid):
+    return f"{pid}-{_start_id(pid)}"
+
+
+def _owner_alive(name):
+    """Whether the process in a workspace name (job_<id>.<pid>-<start id>) is still running"""
+    _, sep, owner = name.rpartition('.')
+    pid, _, start = owner.partition('-')
+    if not sep or not pid.isdigit():
+        # Named before owners were recorded; nothing running can still hold it
+        return False
+    pid = int(pid)
+    current = _start_id(pid)
+    if start and current:
+        return start == current
+    if pid == os.getpid():
+        # No start id to compare, and this process has only just started
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _free_bytes(path):
+    try:
+        st = os.statvfs(path)
+    except OSError:
+        return 0
+    return st.f_bavail * st.f_frsize
+
+
+class JobWorkspace:
+    """Private scratch directory for one render.
+
+    Use as a context manager: the directory (and its tmpfs mount, if one
+    was made) is removed on exit whether the render succeeded, failed or
+    was interrupted.
+    """
+
+    def __init__(self, job_id, size_bytes=None, tmpfs=SCRATCH_TMPFS):
+        self.job_id = job_id
+        self.size_bytes = size_bytes or estimate_job_bytes(60)
+        self.tmpfs = tmpfs
+        self.dir = None
+        self.mounted = False
+
+    @property
+    def on_tmpfs(self):
+        return self.mounted or (self.dir or '').startswith(TMPFS_ROOT + os.sep)
+
+    def _create(self):
+        # Owner in the name so other processes' sweeps leave it alone
+        name = f"{WORKSPACE_PREFIX}{self.job_id}.{_owner(os.getpid())}"
+
+        if self.tmpfs == "mount":
+            path = os.path.join(SCRATCH_ROOT, name)
+            os.makedirs(path, exist_ok=True)
+            result = subprocess.run(
+                ['mount', '-t', 'tmpfs', '-o', f'size={self.size_bytes},mode=0700', 'tmpfs', path],
+                capture_output=True
+            )
+            if result.returncode == 0:
+                self.mounted = True
+                return path
+            print(f"⚠️  tmpfs mount failed ({result.stderr.decode(errors='replace').strip()}), using /dev/shm or disk")
+            os.rmdir(path)
+
+        if self.tmpfs in ("auto", "mount") and os.path.isdir(TMPFS_ROOT):
+            # Leave headroom so concurrent jobs do not fill RAM between them
+            if _free_bytes(TMPFS_ROOT) >= 2 * self.size_bytes:
+                path = os.path.join(TMPFS_ROOT, name)
+                os.makedirs(path, exist_ok=True)
+                return path
+
+        path = os.path.join(SCRATCH_ROOT, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def __enter__(self):
+        self.dir = self._create()
+        with _active_lock:
+            _active.add(self)
+        where = "tmpfs" if self.on_tmpfs else "disk"
+        print(f"📂 Workspace {self.dir} ({where}, {self.size_bytes / (1024 * 1024):.0f} MB)")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def cleanup(self):
+        with _active_lock:
+            _active.discard(self)
+        if not self.dir:
+            return
+        if self.mounted:
+            subprocess.run(['umount', '-l', self.dir], capture_output=True)
+            self.mounted = False
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.dir = None
+
+
+def sweep_stale_workspaces():
+    """Remove workspaces left behind by a process that was killed mid-render.
+
+    Only workspaces whose owner process is gone (or whose pid now belongs
+    to a process started later) are touched, so other workers, CLI renders
+    or benchmark apps sharing the roots keep theirs.
+    """
+    removed = 0
+    for root in (SCRATCH_ROOT, TMPFS_ROOT):
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.startswith(WORKSPACE_PREFIX) and not _owner_alive(name) and os.path.isdir(path):
+                if os.path.ismount(path):
+                    subprocess.run(['umount', '-l', path], capture_output=True)
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+    return removed
+
+
+@atexit.register
+def _cleanup_active():
+    with _active_lock:
+        workspaces = list(_active)
+    for ws in workspaces:
+        ws.cleanup()